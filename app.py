@@ -1,21 +1,13 @@
+import argparse
 import dash
 from dash import html
 import dash_bootstrap_components as dbc
 import os
-import pickle
 from betgroup import BetGroup
+from betstore import BETS_DB_FILENAME, BetStore
+from lazyweeks import load_lazy_betgroups_from_disk, load_lazy_betgroups_from_store
 from bet import BetTypes
 
-# Helper to recursively load all .bets files in bets folder
-def load_all_betgroups(bets_folder):
-    betgroups = []
-    for root, dirs, files in os.walk(bets_folder):
-        for file in files:
-            if file.endswith("output.bets"):
-                with open(os.path.join(root, file), "rb") as f:
-                    betgroups.append(pickle.load(f))
-    return betgroups
-
 # Helper to display a single bet as a dbc.Card
 def bet_to_card(bet):
     game = bet.game
@@ -76,19 +68,45 @@ def betgroup_to_layout(betgroup, level=1):
             children.append(betgroup_to_layout(sub, level=level+1))
     return html.Div(children, style={"marginLeft": f"{level*16}px"})
 
-# Load all betgroups
-all_betgroups = load_all_betgroups("/home/caleb/cfb-bets-tracker/bets")
+# Load all betgroups, from the SQLite store if one has been imported.
+# Weeks are only unpickled when the page is first built, not at import.
+BETS_FOLDER = os.environ.get("CFB_BETS_ROOT", "/home/caleb/cfb-bets-tracker/bets")
+
+
+def load_lazy_betgroups(bets_folder):
+    bets_db_filepath = os.path.join(bets_folder, BETS_DB_FILENAME)
+    if os.path.exists(bets_db_filepath):
+        return load_lazy_betgroups_from_store(BetStore(bets_db_filepath))
+    return load_lazy_betgroups_from_disk(bets_folder)
+
+
+all_betgroups = load_lazy_betgroups(BETS_FOLDER)
+
+
+def serve_layout():
+    return dbc.Container(
+        [
+            html.H1("CFB Bets Tracker", style={"marginTop": "24px"}),
+            html.Div([betgroup_to_layout(bg) for bg in all_betgroups.values()])
+        ],
+        fluid=True,
+        className="dbc"
+    )
+
 
 # Compose layout
 app = dash.Dash(__name__, external_stylesheets=[dbc.themes.DARKLY])
-app.layout = dbc.Container(
-    [
-        html.H1("CFB Bets Tracker", style={"marginTop": "24px"}),
-        html.Div([betgroup_to_layout(bg) for bg in all_betgroups])
-    ],
-    fluid=True,
-    className="dbc"
-)
+app.layout = serve_layout
+# For WSGI servers
+server = app.server
 
 if __name__ == "__main__":
-    app.run(debug=True)
+    parser = argparse.ArgumentParser(description="Serve every week's bets on one page.")
+    parser.add_argument("--bets-root", default=BETS_FOLDER, help="defaults to $CFB_BETS_ROOT")
+    parser.add_argument("--host", default=os.environ.get("CFB_HOST", "127.0.0.1"), help="defaults to $CFB_HOST")
+    parser.add_argument("--port", type=int, default=int(os.environ.get("CFB_PORT", "8050")), help="defaults to $CFB_PORT")
+    args = parser.parse_args()
+
+    if args.bets_root != BETS_FOLDER:
+        all_betgroups = load_lazy_betgroups(args.bets_root)
+    app.run(debug=True, host=args.host, port=args.port)
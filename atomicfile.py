@@ -0,0 +1,25 @@
+from contextlib import contextmanager
+import os
+import tempfile
+
+
+@contextmanager
+def atomic_open(filepath: str, mode: str = "w"):
+    # Written next to the target then renamed over it, so readers only ever see
+    # the old file or the complete new one, never a partial write
+    dirpath = os.path.dirname(filepath) or "."
+    fd, tmp_filepath = tempfile.mkstemp(
+        dir=dirpath, prefix=f".{os.path.basename(filepath)}.", suffix=".tmp"
+    )
+    try:
+        with os.fdopen(fd, mode) as f:
+            yield f
+            f.flush()
+            os.fsync(f.fileno())
+        os.replace(tmp_filepath, filepath)
+    except BaseException:
+        try:
+            os.remove(tmp_filepath)
+        except OSError:
+            pass
+        raise
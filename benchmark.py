@@ -0,0 +1,299 @@
+import argparse
+import json
+import os
+import platform
+import random
+import shutil
+import statistics
+import subprocess
+import tempfile
+import time
+from datetime import datetime, timedelta
+from betgroup import BetGroup
+from convenience import str_to_cfb_bet
+from espnquery import ScoreboardIndex, search_for_cfb_game_using_team_name
+from game import GameRegistry
+from read_bets import parse_cfb_week_bets
+
+FIRST_CFB_FRIDAY = "20250829"
+
+
+def make_synthetic_team(team_number: int) -> dict:
+    return {
+        "displayName": f"Team {team_number} Mascots",
+        "shortDisplayName": f"Team {team_number}",
+        "abbreviation": f"T{team_number}",
+        "logo": f"https://a.espncdn.com/i/teamlogos/ncaa/500/{team_number}.png",
+    }
+
+
+def make_synthetic_scoreboard(
+    cfb_friday: str, num_events: int, final_fraction: float = 0.8, rng: random.Random = None
+) -> dict:
+    if rng is None:
+        rng = random.Random(0)
+    friday_datetime = datetime.strptime(cfb_friday, "%Y%m%d")
+    events = []
+    for event_number in range(num_events):
+        game_datetime = friday_datetime + timedelta(days=event_number % 2, hours=16 + event_number % 6)
+        game_date = game_datetime.strftime("%Y-%m-%dT%H:%MZ")
+        is_final = rng.random() < final_fraction
+        competitors = []
+        for home_away in ["home", "away"]:
+            competitor = {
+                "id": str(len(competitors)),
+                "homeAway": home_away,
+                "score": str(rng.randint(0, 56)),
+                "team": make_synthetic_team(2 * event_number + len(competitors)),
+            }
+            competitors.append(competitor)
+        if is_final:
+            home_won = int(competitors[0]["score"]) > int(competitors[1]["score"])
+            competitors[0]["winner"] = home_won
+            competitors[1]["winner"] = not home_won
+        events.append(
+            {
+                "id": f"{cfb_friday}{event_number:04d}",
+                "date": game_date,
+                "name": f"Team {2 * event_number + 1} at Team {2 * event_number}",
+                "competitions": [
+                    {
+                        "date": game_date,
+                        "neutralSite": event_number % 10 == 0,
+                        "competitors": competitors,
+                        "status": {"type": {"completed": is_final}},
+                    }
+                ],
+            }
+        )
+    return {"leagues": [], "events": events}
+
+
+def make_synthetic_bet_str(num_events: int, rng: random.Random) -> tuple[str, int]:
+    event_number = rng.randrange(num_events)
+    team = f"Team {2 * event_number + rng.randrange(2)}"
+    opposing_team = f"T{2 * event_number + 1}"
+    odds = rng.choice([-110, -115, -105, +100, +120, -150, +250])
+    bet_kind = rng.randrange(6)
+    if bet_kind == 0:
+        return f"{team} ML", odds
+    if bet_kind == 1:
+        return f"{team} {rng.choice([-14.5, -7, -3.5, 2.5, 6.5, 10])}", odds
+    if bet_kind == 2:
+        return f"T{2 * event_number}/{opposing_team} O {rng.randint(38, 65)}.5", odds
+    if bet_kind == 3:
+        return f"T{2 * event_number}/{opposing_team} U {rng.randint(38, 65)}.5", odds
+    if bet_kind == 4:
+        return f"{team} TTP O {rng.randint(14, 38)}.5", odds
+    return f"{team} TTP U {rng.randint(14, 38)}.5", odds
+
+
+def make_synthetic_week_bets_input(
+    cfb_friday: str, num_events: int, num_shows: int, num_bettors: int, num_bets: int, rng: random.Random
+) -> dict:
+    return {
+        "cfb_friday": cfb_friday,
+        "shows": {
+            f"Show {show_number}": {
+                f"Bettor {bettor_number}": [
+                    list(make_synthetic_bet_str(num_events, rng)) for _ in range(num_bets)
+                ]
+                for bettor_number in range(num_bettors)
+            }
+            for show_number in range(num_shows)
+        },
+    }
+
+
+def time_stage(stage_fn, repeat: int) -> dict:
+    durations = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        stage_fn()
+        durations.append(time.perf_counter() - start)
+    return {
+        "min_seconds": min(durations),
+        "median_seconds": statistics.median(durations),
+        "max_seconds": max(durations),
+        "repeat": repeat,
+    }
+
+
+def get_git_commit() -> str:
+    try:
+        return subprocess.run(
+            ["git", "rev-parse", "HEAD"],
+            cwd=os.path.dirname(os.path.abspath(__file__)),
+            capture_output=True,
+            text=True,
+            check=True,
+        ).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def run_benchmarks(
+    num_events: int = 150,
+    num_weeks: int = 4,
+    num_shows: int = 3,
+    num_bettors: int = 4,
+    num_bets: int = 10,
+    repeat: int = 5,
+    seed: int = 0,
+) -> dict:
+    # Only needed for the render stage, and it pulls in dash. Just the rendering helpers,
+    # nothing gets configured or refreshed (that's ui.create_app())
+    from ui import betgroup_section_to_layout, betgroup_to_layout, fragment_cache
+
+    rng = random.Random(seed)
+    first_friday_datetime = datetime.strptime(FIRST_CFB_FRIDAY, "%Y%m%d")
+    weeks = []
+    for week_number in range(num_weeks):
+        cfb_friday = (first_friday_datetime + timedelta(weeks=week_number)).strftime("%Y%m%d")
+        games_data = make_synthetic_scoreboard(cfb_friday, num_events, rng=rng)
+        week_bets_input = make_synthetic_week_bets_input(
+            cfb_friday, num_events, num_shows, num_bettors, num_bets, rng
+        )
+        weeks.append((f"Week {week_number + 1}", games_data, week_bets_input))
+
+    all_bet_lines = [
+        (games_data, bettor, bet_str, odds)
+        for week_name, games_data, week_bets_input in weeks
+        for show_bets in week_bets_input["shows"].values()
+        for bettor, bettor_bets in show_bets.items()
+        for bet_str, odds in bettor_bets
+    ]
+    indexes = {id(games_data): ScoreboardIndex(games_data, GameRegistry()) for _, games_data, _ in weeks}
+
+    def build_indexes():
+        for week_name, games_data, week_bets_input in weeks:
+            ScoreboardIndex(games_data, GameRegistry())
+
+    def parse_bet_strs():
+        for games_data, bettor, bet_str, odds in all_bet_lines:
+            str_to_cfb_bet(bet_str=bet_str, bettor=bettor, odds=odds, games_data=indexes[id(games_data)])
+
+    def search_games():
+        for week_name, games_data, week_bets_input in weeks:
+            scoreboard_index = indexes[id(games_data)]
+            for event in games_data["events"]:
+                competitors = event["competitions"][0]["competitors"]
+                search_for_cfb_game_using_team_name(
+                    search_team_name=competitors[0]["team"]["shortDisplayName"],
+                    games_data=scoreboard_index,
+                    search_opposing_team_name=competitors[1]["team"]["abbreviation"],
+                )
+
+    week_betgroups = {}
+    for week_name, games_data, week_bets_input in weeks:
+        week_betgroup, bet_str_errors = parse_cfb_week_bets(
+            group_name=week_name,
+            shows=week_bets_input["shows"],
+            games_data=ScoreboardIndex(games_data, GameRegistry()),
+        )
+        week_betgroups[week_name] = week_betgroup
+
+    def evaluate_betgroups():
+        for week_betgroup in week_betgroups.values():
+            week_betgroup.evaluate()
+
+    def betgroups_to_json():
+        for week_betgroup in week_betgroups.values():
+            week_betgroup.to_json()
+
+    tmp_dir = tempfile.mkdtemp(prefix="cfb-bets-benchmark-")
+    pickle_filepaths = {
+        week_name: os.path.join(tmp_dir, f"{week_name}.bets") for week_name in week_betgroups
+    }
+
+    def save_betgroups():
+        for week_name, week_betgroup in week_betgroups.items():
+            week_betgroup.save_to_disk(pickle_filepaths[week_name])
+
+    def load_betgroups():
+        for pickle_filepath in pickle_filepaths.values():
+            BetGroup.load_from_disk(pickle_filepath)
+
+    def render_headers():
+        for week_name, week_betgroup in week_betgroups.items():
+            betgroup_to_layout(week_betgroup, [week_name])
+
+    def render_sections(betgroup: BetGroup, section_path: list[str]):
+        betgroup_section_to_layout(betgroup, section_path, level=len(section_path))
+        for sub_name, sub_betgroup in betgroup.sub_betgroups.items():
+            render_sections(sub_betgroup, section_path + [sub_name])
+
+    def render_all_sections():
+        # Cold, every card and header gets built
+        fragment_cache.clear()
+        render_all_sections_cached()
+
+    def render_all_sections_cached():
+        for week_name, week_betgroup in week_betgroups.items():
+            render_sections(week_betgroup, [week_name])
+
+    stages = {
+        "build_scoreboard_index": build_indexes,
+        "str_to_cfb_bet": parse_bet_strs,
+        "search_for_cfb_game_using_team_name": search_games,
+        "betgroup_evaluate": evaluate_betgroups,
+        "betgroup_to_json": betgroups_to_json,
+        "pickle_save": save_betgroups,
+        "pickle_load": load_betgroups,
+        "betgroup_to_layout_headers": render_headers,
+        "betgroup_to_layout_all_sections": render_all_sections,
+        "betgroup_to_layout_all_sections_cached": render_all_sections_cached,
+    }
+    results = {stage_name: time_stage(stage_fn, repeat) for stage_name, stage_fn in stages.items()}
+    pickle_bytes = sum(os.path.getsize(pickle_filepath) for pickle_filepath in pickle_filepaths.values())
+    shutil.rmtree(tmp_dir)
+
+    return {
+        "git_commit": get_git_commit(),
+        "python_version": platform.python_version(),
+        "created_at": datetime.now().isoformat(timespec="seconds"),
+        "config": {
+            "events": num_events,
+            "weeks": num_weeks,
+            "shows": num_shows,
+            "bettors": num_bettors,
+            "bets": num_bets,
+            "total_bets": len(all_bet_lines),
+            "repeat": repeat,
+            "seed": seed,
+        },
+        "sizes": {
+            "pickle_bytes": pickle_bytes,
+            "json_bytes": sum(len(week_betgroup.to_json()) for week_betgroup in week_betgroups.values()),
+        },
+        "stages": results,
+    }
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Time each stage of the tracker on synthetic, offline data.")
+    parser.add_argument("--events", type=int, default=150, help="events on each week's scoreboard")
+    parser.add_argument("--weeks", type=int, default=4)
+    parser.add_argument("--shows", type=int, default=3, help="shows per week")
+    parser.add_argument("--bettors", type=int, default=4, help="bettors per show")
+    parser.add_argument("--bets", type=int, default=10, help="bets per bettor")
+    parser.add_argument("--repeat", type=int, default=5, help="timed runs per stage")
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--output", help="write the JSON results here instead of stdout")
+    args = parser.parse_args()
+
+    benchmark_results = run_benchmarks(
+        num_events=args.events,
+        num_weeks=args.weeks,
+        num_shows=args.shows,
+        num_bettors=args.bettors,
+        num_bets=args.bets,
+        repeat=args.repeat,
+        seed=args.seed,
+    )
+    benchmark_json = json.dumps(benchmark_results, indent=4)
+    if args.output is None:
+        print(benchmark_json)
+    else:
+        with open(args.output, "w") as f:
+            f.write(benchmark_json)
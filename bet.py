@@ -1,7 +1,9 @@
-from dataclasses import dataclass
+from dataclasses import dataclass, field
 from game import Game
 from team import Team
 from enum import Enum
+from slotstate import SlotsPickleMixin
+from versioning import next_version
 
 
 class BetResults(Enum):
@@ -20,17 +22,27 @@ class BetTypes(Enum):
     TEAM_UNDER = "team_under"
 
 
-@dataclass
-class Bet:
+@dataclass(slots=True, weakref_slot=True)
+class Bet(SlotsPickleMixin):
     bettor: str
     game: Game
     odds: int
     result: str
     resulting_unit_profit: float
+    # Underscored, so it stays out of to_json. Set by BetGroup.new_bet.
+    _betgroup: "BetGroup" = field(default=None, init=False, repr=False, compare=False)
+    # Goes up whenever the result changes, BetGroup bumps it as it evaluates
+    _version: int = field(
+        default_factory=next_version, init=False, repr=False, compare=False, metadata={"pickle": False}
+    )
 
     def __post_init__(self):
         self.evaluate()
 
+    def get_render_version(self) -> tuple[int, int]:
+        # A card shows the game's score too, so it's stale if either one moved
+        return self._version, self.game._version
+
     def evaluate(self):
         raise NotImplementedError(
             "Base class Bet does not have evaluation implementation"
@@ -48,7 +60,7 @@ class Bet:
             self.resulting_unit_profit = 0.0
 
 
-@dataclass
+@dataclass(slots=True)
 class MoneylineBet(Bet):
     taking_team: Team
     bet_type: str = BetTypes.MONEYLINE.value
@@ -65,10 +77,10 @@ class MoneylineBet(Bet):
                 self.result = BetResults.HIT.value
             else:
                 self.result = BetResults.MISS.value
-        super().update_profits()
+        self.update_profits()
 
 
-@dataclass
+@dataclass(slots=True)
 class SpreadBet(Bet):
     taking_team: Team
     taking_spread: float
@@ -89,10 +101,10 @@ class SpreadBet(Bet):
                 self.result = BetResults.PUSH.value
             else:
                 self.result = BetResults.MISS.value
-        super().update_profits()
+        self.update_profits()
 
 
-@dataclass
+@dataclass(slots=True)
 class OverBet(Bet):
     taking_points: float
     bet_type: str = BetTypes.OVER.value
@@ -109,10 +121,10 @@ class OverBet(Bet):
                 self.result = BetResults.PUSH.value
             else:
                 self.result = BetResults.MISS.value
-        super().update_profits()
+        self.update_profits()
 
 
-@dataclass
+@dataclass(slots=True)
 class UnderBet(Bet):
     taking_points: float
     bet_type: str = BetTypes.UNDER.value
@@ -129,10 +141,10 @@ class UnderBet(Bet):
                 self.result = BetResults.PUSH.value
             else:
                 self.result = BetResults.MISS.value
-        super().update_profits()
+        self.update_profits()
 
 
-@dataclass
+@dataclass(slots=True)
 class TeamOverBet(Bet):
     taking_team: Team
     taking_points: float
@@ -150,10 +162,10 @@ class TeamOverBet(Bet):
                 self.result = BetResults.PUSH.value
             else:
                 self.result = BetResults.MISS.value
-        super().update_profits()
+        self.update_profits()
 
 
-@dataclass
+@dataclass(slots=True)
 class TeamUnderBet(Bet):
     taking_team: Team
     taking_points: float
@@ -171,4 +183,14 @@ class TeamUnderBet(Bet):
                 self.result = BetResults.PUSH.value
             else:
                 self.result = BetResults.MISS.value
-        super().update_profits()
+        self.update_profits()
+
+
+BET_CLASSES = {
+    BetTypes.MONEYLINE.value: MoneylineBet,
+    BetTypes.SPREAD.value: SpreadBet,
+    BetTypes.OVER.value: OverBet,
+    BetTypes.UNDER.value: UnderBet,
+    BetTypes.TEAM_OVER.value: TeamOverBet,
+    BetTypes.TEAM_UNDER.value: TeamUnderBet,
+}
@@ -1,12 +1,30 @@
-from dataclasses import dataclass, field, asdict
+from dataclasses import dataclass, field
+from typing import Callable, TextIO
 from typing_extensions import Self
 from bet import Bet, BetResults
-import json
+from game import GameRegistry, game_registry
+from metrics import metrics
+from atomicfile import atomic_open
+import hashlib
+import io
+import jsonstream
+import math
 import pickle
+from slotstate import SlotsPickleMixin
+from versioning import next_version
 
+# Called as listener(bet, old_result, old_profit) whenever evaluating changes a bet's result.
+# Leaderboards hang off this to stay up to date without walking the trees.
+bet_result_listeners: list[Callable[[Bet, str, float], None]] = []
 
-@dataclass
-class BetGroup:
+
+def notify_bet_result_changed(bet: Bet, old_result: str, old_profit: float):
+    for listener in bet_result_listeners:
+        listener(bet, old_result, old_profit)
+
+
+@dataclass(slots=True, weakref_slot=True)
+class BetGroup(SlotsPickleMixin):
     group_name: str
     sub_betgroups: dict[str, Self] = field(default_factory=dict)
     bets: list[Bet] = field(default_factory=list)
@@ -15,6 +33,15 @@ class BetGroup:
     pushes: int = 0
     pendings: int = 0
     profit: float = 0.0
+    is_settled: bool = False
+    # Underscored, so it stays out of to_json. Rebuilt by link() on load.
+    _parent: Self = field(default=None, init=False, repr=False, compare=False)
+    # Fingerprint of the contents as of the last save. Gets pickled along with the betgroup.
+    _saved_fingerprint: str = field(default=None, init=False, repr=False, compare=False)
+    # Goes up whenever the totals change, so a rendered header knows when it's stale
+    _version: int = field(
+        default_factory=next_version, init=False, repr=False, compare=False, metadata={"pickle": False}
+    )
 
     def new_sub_betgroup(self, betgroup: Self):
         if len(self.bets) > 0:
@@ -22,6 +49,7 @@ class BetGroup:
                 f"This betgroup with name {self.group_name} already has bets. You cannot use it to store betgroups."
             )
         self.sub_betgroups[betgroup.group_name] = betgroup
+        betgroup._parent = self
 
     def new_bet(self, bet: Bet):
         if len(self.sub_betgroups) > 0:
@@ -31,8 +59,40 @@ class BetGroup:
         if self.bets is None:
             self.bets = []
         self.bets.append(bet)
+        bet._betgroup = self
+
+    def link(self):
+        for bet in self.bets:
+            bet._betgroup = self
+        for sub_betgroup in self.sub_betgroups.values():
+            sub_betgroup._parent = self
+            sub_betgroup.link()
+        self.is_settled = self.pendings == 0
+
+    def share_games(self, registry: GameRegistry = game_registry):
+        for bet in self.bets:
+            shared_game = registry.register(bet.game)
+            if shared_game is bet.game:
+                continue
+            if hasattr(bet, "taking_team"):
+                bet.taking_team = shared_game.get_team(bet.taking_team.full_name)
+            bet.game = shared_game
+        for sub_betgroup in self.sub_betgroups.values():
+            sub_betgroup.share_games(registry)
 
     def evaluate(self):
+        # Only the outermost call gets timed, not every sub betgroup
+        if self._parent is None:
+            with metrics.timed("betgroup_evaluate"):
+                self.evaluate_tree()
+        else:
+            self.evaluate_tree()
+
+    def get_totals(self) -> tuple[int, int, int, int, float]:
+        return self.hits, self.misses, self.pushes, self.pendings, self.profit
+
+    def evaluate_tree(self):
+        old_totals = self.get_totals()
         self.hits = 0
         self.misses = 0
         self.pushes = 0
@@ -40,7 +100,12 @@ class BetGroup:
         self.profit = 0
         if len(self.bets) > 0:
             for bet in self.bets:
+                old_result = bet.result
+                old_profit = bet.resulting_unit_profit
                 bet.evaluate()
+                if bet.result != old_result or bet.resulting_unit_profit != old_profit:
+                    bet._version = next_version()
+                    notify_bet_result_changed(bet, old_result, old_profit)
                 if bet.result == BetResults.HIT.value:
                     self.hits += 1
                 elif bet.result == BetResults.MISS.value:
@@ -52,30 +117,141 @@ class BetGroup:
                 self.profit += bet.resulting_unit_profit
         else:
             for betgroup_name, betgroup in self.sub_betgroups.items():
-                betgroup.evaluate()
+                # A settled betgroup's games are all over, so its totals can't change
+                if not betgroup.is_settled:
+                    betgroup.evaluate_tree()
                 self.hits += betgroup.hits
                 self.misses += betgroup.misses
                 self.pushes += betgroup.pushes
                 self.pendings += betgroup.pendings
                 self.profit += betgroup.profit
+        self.is_settled = self.pendings == 0
+        if self.get_totals() != old_totals:
+            self._version = next_version()
+
+    def evaluate_bet(self, bet: Bet) -> bool:
+        old_result = bet.result
+        old_profit = bet.resulting_unit_profit
+        bet.evaluate()
+        if bet.result == old_result and bet.resulting_unit_profit == old_profit:
+            return False
+        metrics.increment("bet_results_changed")
+        bet._version = next_version()
+        # Only the difference walks up, so the cost is the depth of the tree
+        betgroup = self
+        while betgroup is not None:
+            betgroup.count_result(old_result, old_profit, -1)
+            betgroup.count_result(bet.result, bet.resulting_unit_profit, 1)
+            betgroup.is_settled = betgroup.pendings == 0
+            betgroup._version = next_version()
+            betgroup = betgroup._parent
+        notify_bet_result_changed(bet, old_result, old_profit)
+        return True
+
+    def count_result(self, result: str, profit: float, sign: int):
+        if result == BetResults.HIT.value:
+            self.hits += sign
+        elif result == BetResults.MISS.value:
+            self.misses += sign
+        elif result == BetResults.PUSH.value:
+            self.pushes += sign
+        else:
+            self.pendings += sign
+        self.profit += sign * profit
+
+    def tally(self) -> tuple[int, int, int, int, float]:
+        hits = 0
+        misses = 0
+        pushes = 0
+        pendings = 0
+        profit = 0
+        if len(self.bets) > 0:
+            for bet in self.bets:
+                if bet.result == BetResults.HIT.value:
+                    hits += 1
+                elif bet.result == BetResults.MISS.value:
+                    misses += 1
+                elif bet.result == BetResults.PUSH.value:
+                    pushes += 1
+                else:
+                    pendings += 1
+                profit += bet.resulting_unit_profit
+        else:
+            for sub_betgroup in self.sub_betgroups.values():
+                sub_hits, sub_misses, sub_pushes, sub_pendings, sub_profit = sub_betgroup.tally()
+                hits += sub_hits
+                misses += sub_misses
+                pushes += sub_pushes
+                pendings += sub_pendings
+                profit += sub_profit
+        return hits, misses, pushes, pendings, profit
+
+    def is_consistent(self) -> bool:
+        hits, misses, pushes, pendings, profit = self.tally()
+        if (hits, misses, pushes, pendings) != (self.hits, self.misses, self.pushes, self.pendings):
+            return False
+        if not math.isclose(profit, self.profit, abs_tol=1e-9):
+            return False
+        return all(sub_betgroup.is_consistent() for sub_betgroup in self.sub_betgroups.values())
 
     def to_json(self, indent: int = 4):
-        betgroup_dict = asdict(self)
-        betgroup_json = json.dumps(betgroup_dict, indent=indent)
-        return betgroup_json
+        betgroup_json = io.StringIO()
+        self.write_json(betgroup_json, indent=indent)
+        return betgroup_json.getvalue()
 
-    def save_to_disk(self, filepath: str):
-        with open(filepath, "wb") as f:
-            pickle.dump(self, f)
+    def write_json(self, f: TextIO, indent: int = 4):
+        # Streams straight from the tree, no asdict copy. indent=None is compact.
+        with metrics.timed("betgroup_to_json"):
+            jsonstream.dump(self, f, indent=indent)
 
-    def get_start_and_end_dates_of_all_bets(self) -> tuple[str, str]:
+    def fingerprint(self) -> str:
+        fingerprint_hash = hashlib.sha256()
+        jsonstream.write_value(self, lambda chunk: fingerprint_hash.update(chunk.encode()))
+        return fingerprint_hash.hexdigest()
+
+    def get_unsaved_fingerprint(self) -> str:
+        fingerprint = self.fingerprint()
+        if fingerprint == self._saved_fingerprint:
+            return None
+        return fingerprint
+
+    def mark_saved(self, fingerprint: str):
+        self._saved_fingerprint = fingerprint
+
+    def save_to_disk(self, filepath: str, fingerprint: str = None, mark_saved: bool = True):
+        fingerprint = self.fingerprint() if fingerprint is None else fingerprint
+        # The pickle carries the fingerprint of what's in it, but in memory the betgroup only
+        # counts as saved once the write went through
+        unsaved_fingerprint = self._saved_fingerprint
+        self._saved_fingerprint = fingerprint
+        try:
+            with metrics.timed("pickle_save"), atomic_open(filepath, "wb") as f:
+                pickle.dump(self, f)
+        finally:
+            self._saved_fingerprint = unsaved_fingerprint
+        if mark_saved:
+            self.mark_saved(fingerprint)
+
+    def save_json_to_disk(self, filepath: str, indent: int = 4):
+        with atomic_open(filepath) as f:
+            self.write_json(f, indent=indent)
+
+    def get_start_and_end_dates_of_all_bets(self, only_pending: bool = False) -> tuple[str, str]:
         all_dates = []
         if len(self.bets) > 0:
             for bet in self.bets:
+                if only_pending and bet.result != BetResults.PENDING.value:
+                    continue
                 all_dates.append(bet.game.date)
         else:
             for sub_betgroup in self.sub_betgroups.values():
-                sub_start, sub_end = sub_betgroup.get_start_and_end_dates_of_all_bets()
+                if only_pending and sub_betgroup.is_settled:
+                    continue
+                sub_start, sub_end = sub_betgroup.get_start_and_end_dates_of_all_bets(
+                    only_pending=only_pending
+                )
+                if sub_start is None:
+                    continue
                 all_dates.append(sub_start)
                 all_dates.append(sub_end)
         if len(all_dates) == 0:
@@ -83,6 +259,17 @@ class BetGroup:
         return min(all_dates), max(all_dates)
 
     @staticmethod
-    def load_from_disk(filepath: str) -> Self:
-        with open(filepath, "rb") as f:
-            return pickle.load(f)
+    def load_from_disk(filepath: str, registry: GameRegistry = game_registry) -> Self:
+        with metrics.timed("pickle_load"), open(filepath, "rb") as f:
+            betgroup = pickle.load(f)
+        betgroup.link()
+        betgroup.share_games(registry)
+        return betgroup
+
+    @staticmethod
+    def load_from_bytes(data: bytes, registry: GameRegistry = game_registry) -> Self:
+        with metrics.timed("pickle_load"):
+            betgroup = pickle.loads(data)
+        betgroup.link()
+        betgroup.share_games(registry)
+        return betgroup
@@ -0,0 +1,537 @@
+from bet import Bet, BET_CLASSES
+from betgroup import BetGroup
+from game import Game, GameRegistry, game_registry
+from team import TeamInGame
+import os
+import sqlite3
+import threading
+import weakref
+
+# Where ui.py and read_bets.py look for the store, next to the weeks
+BETS_DB_FILENAME = "bets.sqlite3"
+# Ids per IN (...), under SQLite's oldest limit on query parameters
+MAX_IN_PARAMS = 500
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS teams (
+    id INTEGER PRIMARY KEY,
+    full_name TEXT NOT NULL UNIQUE,
+    short_name TEXT NOT NULL,
+    abbreviation TEXT NOT NULL,
+    logo_url TEXT NOT NULL
+);
+CREATE TABLE IF NOT EXISTS games (
+    id INTEGER PRIMARY KEY,
+    game_key TEXT NOT NULL UNIQUE,
+    event_id TEXT,
+    start_time TEXT,
+    date TEXT NOT NULL,
+    is_over INTEGER NOT NULL,
+    is_neutral_site INTEGER NOT NULL
+);
+CREATE TABLE IF NOT EXISTS game_teams (
+    game_id INTEGER NOT NULL REFERENCES games(id),
+    position INTEGER NOT NULL,
+    team_id INTEGER NOT NULL REFERENCES teams(id),
+    score INTEGER NOT NULL,
+    is_home_team INTEGER NOT NULL,
+    PRIMARY KEY (game_id, position)
+);
+CREATE TABLE IF NOT EXISTS betgroups (
+    id INTEGER PRIMARY KEY,
+    parent_id INTEGER REFERENCES betgroups(id),
+    position INTEGER NOT NULL,
+    source_path TEXT UNIQUE,
+    group_name TEXT NOT NULL,
+    hits INTEGER NOT NULL,
+    misses INTEGER NOT NULL,
+    pushes INTEGER NOT NULL,
+    pendings INTEGER NOT NULL,
+    profit REAL NOT NULL,
+    is_settled INTEGER NOT NULL
+);
+CREATE TABLE IF NOT EXISTS bets (
+    id INTEGER PRIMARY KEY,
+    betgroup_id INTEGER NOT NULL REFERENCES betgroups(id),
+    position INTEGER NOT NULL,
+    bettor TEXT NOT NULL,
+    bet_type TEXT NOT NULL,
+    odds INTEGER NOT NULL,
+    result TEXT NOT NULL,
+    resulting_unit_profit REAL NOT NULL,
+    game_id INTEGER NOT NULL REFERENCES games(id),
+    taking_team_id INTEGER REFERENCES teams(id),
+    taking_spread REAL,
+    taking_points REAL
+);
+CREATE INDEX IF NOT EXISTS betgroups_parent_id_idx ON betgroups(parent_id);
+CREATE INDEX IF NOT EXISTS bets_betgroup_id_idx ON bets(betgroup_id);
+CREATE INDEX IF NOT EXISTS bets_game_id_idx ON bets(game_id);
+CREATE INDEX IF NOT EXISTS bets_bettor_idx ON bets(bettor);
+CREATE INDEX IF NOT EXISTS bets_result_idx ON bets(result);
+CREATE INDEX IF NOT EXISTS bets_bet_type_idx ON bets(bet_type);
+CREATE INDEX IF NOT EXISTS games_date_idx ON games(date);
+"""
+
+
+class BetStore:
+    def __init__(self, db_filepath: str, registry: GameRegistry = game_registry):
+        self.db_filepath = db_filepath
+        self.registry = registry
+        self.connection = sqlite3.connect(db_filepath, check_same_thread=False)
+        self.connection.row_factory = sqlite3.Row
+        self.connection.execute("PRAGMA journal_mode=WAL")
+        self.connection.execute("PRAGMA foreign_keys=ON")
+        self.connection.executescript(SCHEMA)
+        self.migrate()
+        self.lock = threading.RLock()
+        # Loaded/saved objects mapped to their rows. Only weakly, so weeks and games nothing uses
+        # anymore can still be freed, and an entry goes away with its object before its id() is reused.
+        self.row_ids: dict[int, tuple[int, weakref.ref]] = {}
+
+    def migrate(self):
+        game_columns = [row["name"] for row in self.connection.execute("PRAGMA table_info(games)")]
+        if "start_time" not in game_columns:
+            self.connection.execute("ALTER TABLE games ADD COLUMN start_time TEXT")
+
+    def close(self):
+        self.connection.close()
+
+    def get_row_id(self, obj) -> int:
+        row_id_and_ref = self.row_ids.get(id(obj))
+        if row_id_and_ref is None or row_id_and_ref[1]() is not obj:
+            return None
+        return row_id_and_ref[0]
+
+    def set_row_id(self, obj, row_id: int):
+        obj_id = id(obj)
+
+        def forget(ref: weakref.ref):
+            row_id_and_ref = self.row_ids.get(obj_id)
+            if row_id_and_ref is not None and row_id_and_ref[1] is ref:
+                self.row_ids.pop(obj_id, None)
+
+        self.row_ids[obj_id] = (row_id, weakref.ref(obj, forget))
+
+    def forget_row_ids(self, row_type: type, row_ids: set[int]):
+        # Games and bets share row ids with betgroups, so the type tells them apart
+        for obj_id, (row_id, ref) in list(self.row_ids.items()):
+            if row_id in row_ids and isinstance(ref(), row_type):
+                self.row_ids.pop(obj_id, None)
+
+    def save_team(self, team: TeamInGame) -> int:
+        self.connection.execute(
+            """
+            INSERT INTO teams (full_name, short_name, abbreviation, logo_url) VALUES (?, ?, ?, ?)
+            ON CONFLICT (full_name) DO UPDATE SET
+                short_name = excluded.short_name,
+                abbreviation = excluded.abbreviation,
+                logo_url = excluded.logo_url
+            """,
+            (team.full_name, team.short_name, team.abbreviation, team.logo_url),
+        )
+        return self.connection.execute(
+            "SELECT id FROM teams WHERE full_name = ?", (team.full_name,)
+        ).fetchone()["id"]
+
+    def save_game(self, game: Game) -> int:
+        game_id = self.get_row_id(game)
+        if game_id is not None:
+            return game_id
+
+        self.connection.execute(
+            """
+            INSERT INTO games (game_key, event_id, start_time, date, is_over, is_neutral_site)
+            VALUES (?, ?, ?, ?, ?, ?)
+            ON CONFLICT (game_key) DO UPDATE SET is_over = excluded.is_over, start_time = excluded.start_time
+            """,
+            (
+                game.get_key(),
+                game.event_id,
+                game.start_time,
+                game.date,
+                game.is_over,
+                game.is_neutral_site,
+            ),
+        )
+        game_id = self.connection.execute(
+            "SELECT id FROM games WHERE game_key = ?", (game.get_key(),)
+        ).fetchone()["id"]
+        for position, team in enumerate(game.teams):
+            self.connection.execute(
+                """
+                INSERT OR REPLACE INTO game_teams (game_id, position, team_id, score, is_home_team)
+                VALUES (?, ?, ?, ?, ?)
+                """,
+                (game_id, position, self.save_team(team), team.score, team.is_home_team),
+            )
+        self.set_row_id(game, game_id)
+        return game_id
+
+    def insert_betgroup(
+        self, betgroup: BetGroup, parent_id: int = None, position: int = 0, source_path: str = None
+    ) -> int:
+        betgroup_id = self.connection.execute(
+            """
+            INSERT INTO betgroups (
+                parent_id, position, source_path, group_name, hits, misses, pushes, pendings, profit, is_settled
+            ) VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?)
+            """,
+            (
+                parent_id,
+                position,
+                source_path,
+                betgroup.group_name,
+                betgroup.hits,
+                betgroup.misses,
+                betgroup.pushes,
+                betgroup.pendings,
+                betgroup.profit,
+                betgroup.is_settled,
+            ),
+        ).lastrowid
+        self.set_row_id(betgroup, betgroup_id)
+
+        for bet_position, bet in enumerate(betgroup.bets):
+            taking_team = getattr(bet, "taking_team", None)
+            bet_id = self.connection.execute(
+                """
+                INSERT INTO bets (
+                    betgroup_id, position, bettor, bet_type, odds, result, resulting_unit_profit,
+                    game_id, taking_team_id, taking_spread, taking_points
+                ) VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)
+                """,
+                (
+                    betgroup_id,
+                    bet_position,
+                    bet.bettor,
+                    bet.bet_type,
+                    bet.odds,
+                    bet.result,
+                    bet.resulting_unit_profit,
+                    self.save_game(bet.game),
+                    None if taking_team is None else self.save_team(taking_team),
+                    getattr(bet, "taking_spread", None),
+                    getattr(bet, "taking_points", None),
+                ),
+            ).lastrowid
+            self.set_row_id(bet, bet_id)
+
+        for sub_position, sub_betgroup in enumerate(betgroup.sub_betgroups.values()):
+            self.insert_betgroup(sub_betgroup, parent_id=betgroup_id, position=sub_position)
+        return betgroup_id
+
+    def delete_betgroup(self, betgroup_id: int):
+        bet_ids = set()
+        betgroup_ids = set()
+        self.delete_betgroup_rows(betgroup_id, bet_ids, betgroup_ids)
+        # The objects loaded from them can't be saved back to rows that are gone
+        self.forget_row_ids(Bet, bet_ids)
+        self.forget_row_ids(BetGroup, betgroup_ids)
+
+    def delete_betgroup_rows(self, betgroup_id: int, bet_ids: set[int], betgroup_ids: set[int]):
+        sub_betgroup_ids = [
+            row["id"]
+            for row in self.connection.execute(
+                "SELECT id FROM betgroups WHERE parent_id = ?", (betgroup_id,)
+            )
+        ]
+        for sub_betgroup_id in sub_betgroup_ids:
+            self.delete_betgroup_rows(sub_betgroup_id, bet_ids, betgroup_ids)
+        bet_ids.update(
+            row["id"]
+            for row in self.connection.execute("SELECT id FROM bets WHERE betgroup_id = ?", (betgroup_id,))
+        )
+        betgroup_ids.add(betgroup_id)
+        self.connection.execute("DELETE FROM bets WHERE betgroup_id = ?", (betgroup_id,))
+        self.connection.execute("DELETE FROM betgroups WHERE id = ?", (betgroup_id,))
+
+    def save_betgroup(self, betgroup: BetGroup, source_path: str) -> int:
+        with self.lock, self.connection:
+            row = self.connection.execute(
+                "SELECT id FROM betgroups WHERE source_path = ?", (source_path,)
+            ).fetchone()
+            if row is not None:
+                self.delete_betgroup(row["id"])
+            return self.insert_betgroup(betgroup, source_path=source_path)
+
+    def has_betgroup(self, source_path: str) -> bool:
+        with self.lock:
+            return (
+                self.connection.execute(
+                    "SELECT 1 FROM betgroups WHERE source_path = ?", (source_path,)
+                ).fetchone()
+                is not None
+            )
+
+    def list_betgroups(self) -> list[sqlite3.Row]:
+        with self.lock:
+            return self.connection.execute(
+                """
+                SELECT id, source_path, group_name, hits, misses, pushes, pendings, profit, is_settled
+                FROM betgroups WHERE parent_id IS NULL ORDER BY source_path
+                """
+            ).fetchall()
+
+    def load_games(self, game_ids: set[int], registry: GameRegistry = None) -> dict[int, Game]:
+        # Two queries per chunk of games, not two per game
+        game_ids = sorted(game_ids)
+        game_rows = []
+        team_rows_by_game_id: dict[int, list[sqlite3.Row]] = {}
+        for chunk_start in range(0, len(game_ids), MAX_IN_PARAMS):
+            chunk_game_ids = game_ids[chunk_start : chunk_start + MAX_IN_PARAMS]
+            placeholders = ", ".join("?" * len(chunk_game_ids))
+            game_rows += self.connection.execute(
+                f"SELECT * FROM games WHERE id IN ({placeholders})", chunk_game_ids
+            ).fetchall()
+            for team_row in self.connection.execute(
+                f"""
+                SELECT game_teams.game_id, game_teams.score, game_teams.is_home_team, teams.*
+                FROM game_teams JOIN teams ON teams.id = game_teams.team_id
+                WHERE game_teams.game_id IN ({placeholders}) ORDER BY game_teams.game_id, game_teams.position
+                """,
+                chunk_game_ids,
+            ):
+                team_rows_by_game_id.setdefault(team_row["game_id"], []).append(team_row)
+
+        games = {}
+        for game_row in game_rows:
+            game_id = game_row["id"]
+            game = Game(
+                teams=[
+                    TeamInGame.from_team_info(
+                        full_name=team_row["full_name"],
+                        short_name=team_row["short_name"],
+                        abbreviation=team_row["abbreviation"],
+                        logo_url=team_row["logo_url"],
+                        score=team_row["score"],
+                        is_home_team=bool(team_row["is_home_team"]),
+                    )
+                    for team_row in team_rows_by_game_id.get(game_id, [])
+                ],
+                date=game_row["date"],
+                is_over=bool(game_row["is_over"]),
+                is_neutral_site=bool(game_row["is_neutral_site"]),
+                event_id=game_row["event_id"],
+                start_time=game_row["start_time"],
+            )
+            if registry is None:
+                game = self.registry.register(game)
+                self.set_row_id(game, game_id)
+            else:
+                game = registry.register(game)
+            games[game_id] = game
+        return games
+
+    # Passing a registry loads a detached copy, for readers that must never see the refresher's
+    # objects. Its rows aren't tracked, so it can't be saved back through save_changes.
+    def load_betgroup_row(self, betgroup_row: sqlite3.Row, registry: GameRegistry = None) -> BetGroup:
+        betgroup = BetGroup(
+            group_name=betgroup_row["group_name"],
+            hits=betgroup_row["hits"],
+            misses=betgroup_row["misses"],
+            pushes=betgroup_row["pushes"],
+            pendings=betgroup_row["pendings"],
+            profit=betgroup_row["profit"],
+            is_settled=bool(betgroup_row["is_settled"]),
+        )
+        if registry is None:
+            self.set_row_id(betgroup, betgroup_row["id"])
+
+        bet_rows = self.connection.execute(
+            """
+            SELECT bets.*, teams.full_name AS taking_team_full_name
+            FROM bets LEFT JOIN teams ON teams.id = bets.taking_team_id
+            WHERE bets.betgroup_id = ? ORDER BY bets.position
+            """,
+            (betgroup_row["id"],),
+        ).fetchall()
+        games = self.load_games({bet_row["game_id"] for bet_row in bet_rows}, registry)
+        for bet_row in bet_rows:
+            game = games[bet_row["game_id"]]
+            bet_kwargs = {
+                "bettor": bet_row["bettor"],
+                "game": game,
+                "odds": bet_row["odds"],
+                "result": bet_row["result"],
+                "resulting_unit_profit": bet_row["resulting_unit_profit"],
+            }
+            if bet_row["taking_team_full_name"] is not None:
+                bet_kwargs["taking_team"] = game.get_team(bet_row["taking_team_full_name"])
+            if bet_row["taking_spread"] is not None:
+                bet_kwargs["taking_spread"] = bet_row["taking_spread"]
+            if bet_row["taking_points"] is not None:
+                bet_kwargs["taking_points"] = bet_row["taking_points"]
+            bet = BET_CLASSES[bet_row["bet_type"]](**bet_kwargs)
+            if registry is None:
+                self.set_row_id(bet, bet_row["id"])
+            betgroup.new_bet(bet)
+
+        sub_betgroup_rows = self.connection.execute(
+            "SELECT * FROM betgroups WHERE parent_id = ? ORDER BY position",
+            (betgroup_row["id"],),
+        ).fetchall()
+        for sub_betgroup_row in sub_betgroup_rows:
+            betgroup.new_sub_betgroup(self.load_betgroup_row(sub_betgroup_row, registry))
+        return betgroup
+
+    def load_betgroup(self, source_path: str, registry: GameRegistry = None) -> BetGroup:
+        with self.lock:
+            betgroup_row = self.connection.execute(
+                "SELECT * FROM betgroups WHERE source_path = ?", (source_path,)
+            ).fetchone()
+            if betgroup_row is None:
+                raise ValueError(f"No betgroup stored for {source_path}")
+            return self.load_betgroup_row(betgroup_row, registry)
+
+    def load_all_betgroups(self, only_pending: bool = False) -> dict[str, BetGroup]:
+        betgroups = {}
+        for betgroup_row in self.list_betgroups():
+            if only_pending and betgroup_row["is_settled"]:
+                continue
+            betgroups[betgroup_row["source_path"]] = self.load_betgroup(betgroup_row["source_path"])
+        return betgroups
+
+    def query_bets(
+        self,
+        bettor: str = None,
+        bet_type: str = None,
+        result: str = None,
+        start_date: str = None,
+        end_date: str = None,
+    ) -> list[sqlite3.Row]:
+        conditions = []
+        params = []
+        for column, value in [
+            ("bets.bettor", bettor),
+            ("bets.bet_type", bet_type),
+            ("bets.result", result),
+        ]:
+            if value is not None:
+                conditions.append(f"{column} = ?")
+                params.append(value)
+        if start_date is not None:
+            conditions.append("games.date >= ?")
+            params.append(start_date)
+        if end_date is not None:
+            conditions.append("games.date <= ?")
+            params.append(end_date)
+        where = "" if len(conditions) == 0 else "WHERE " + " AND ".join(conditions)
+        with self.lock:
+            return self.connection.execute(
+                f"""
+                SELECT bets.*, games.date AS game_date
+                FROM bets JOIN games ON games.id = bets.game_id
+                {where} ORDER BY games.date, bets.id
+                """,
+                params,
+            ).fetchall()
+
+    def query_leaderboard_bets(self) -> list[sqlite3.Row]:
+        # Every bet with its week and show, one row per team of its game, without building any objects
+        with self.lock:
+            return self.connection.execute(
+                """
+                WITH RECURSIVE tree (id, root_id, show, depth) AS (
+                    SELECT id, id, NULL, 0 FROM betgroups WHERE parent_id IS NULL
+                    UNION ALL
+                    SELECT
+                        betgroups.id,
+                        tree.root_id,
+                        CASE WHEN tree.depth = 0 THEN betgroups.group_name ELSE tree.show END,
+                        tree.depth + 1
+                    FROM betgroups JOIN tree ON betgroups.parent_id = tree.id
+                )
+                SELECT
+                    bets.id AS bet_id,
+                    roots.source_path,
+                    roots.group_name AS week,
+                    tree.show,
+                    bets.bettor,
+                    bets.bet_type,
+                    bets.result,
+                    bets.resulting_unit_profit,
+                    teams.full_name AS team
+                FROM bets
+                JOIN tree ON tree.id = bets.betgroup_id
+                JOIN betgroups AS roots ON roots.id = tree.root_id
+                JOIN game_teams ON game_teams.game_id = bets.game_id
+                JOIN teams ON teams.id = game_teams.team_id
+                ORDER BY bets.id, game_teams.position
+                """
+            ).fetchall()
+
+    def update_game(self, game: Game):
+        game_id = self.get_row_id(game)
+        if game_id is None:
+            raise ValueError(f"Game {game.get_key()} was not loaded from or saved to this store")
+        self.connection.execute(
+            "UPDATE games SET is_over = ?, event_id = ?, start_time = ? WHERE id = ?",
+            (game.is_over, game.event_id, game.start_time, game_id),
+        )
+        for position, team in enumerate(game.teams):
+            self.connection.execute(
+                "UPDATE game_teams SET score = ? WHERE game_id = ? AND position = ?",
+                (team.score, game_id, position),
+            )
+
+    def update_bet(self, bet: Bet):
+        bet_id = self.get_row_id(bet)
+        if bet_id is None:
+            raise ValueError("Bet was not loaded from or saved to this store")
+        self.connection.execute(
+            "UPDATE bets SET result = ?, resulting_unit_profit = ? WHERE id = ?",
+            (bet.result, bet.resulting_unit_profit, bet_id),
+        )
+
+    def update_betgroup(self, betgroup: BetGroup):
+        betgroup_id = self.get_row_id(betgroup)
+        if betgroup_id is None:
+            raise ValueError(f"Betgroup {betgroup.group_name} was not loaded from or saved to this store")
+        self.connection.execute(
+            """
+            UPDATE betgroups SET hits = ?, misses = ?, pushes = ?, pendings = ?, profit = ?, is_settled = ?
+            WHERE id = ?
+            """,
+            (
+                betgroup.hits,
+                betgroup.misses,
+                betgroup.pushes,
+                betgroup.pendings,
+                betgroup.profit,
+                betgroup.is_settled,
+                betgroup_id,
+            ),
+        )
+
+    def save_changes(self, changed_games: list[Game], changed_bets: list[Bet]):
+        with self.lock, self.connection:
+            for game in changed_games:
+                self.update_game(game)
+            updated_betgroup_ids = set()
+            for bet in changed_bets:
+                self.update_bet(bet)
+                betgroup = bet._betgroup
+                while betgroup is not None:
+                    if id(betgroup) not in updated_betgroup_ids:
+                        updated_betgroup_ids.add(id(betgroup))
+                        self.update_betgroup(betgroup)
+                    betgroup = betgroup._parent
+
+    def import_from_pickles(self, bets_folder: str) -> list[str]:
+        imported_filepaths = []
+        for root, dirs, files in os.walk(bets_folder):
+            for file in files:
+                if file.endswith(".bets"):
+                    filepath = os.path.join(root, file)
+                    self.save_betgroup(BetGroup.load_from_disk(filepath), filepath)
+                    imported_filepaths.append(filepath)
+        return imported_filepaths
+
+    def export_to_pickles(self) -> list[str]:
+        exported_filepaths = []
+        for betgroup_row in self.list_betgroups():
+            filepath = betgroup_row["source_path"]
+            self.load_betgroup(filepath).save_to_disk(filepath)
+            exported_filepaths.append(filepath)
+        return exported_filepaths
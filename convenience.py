@@ -1,130 +1,121 @@
 import re
+from dataclasses import dataclass
 from bet import (
-    MoneylineBet,
-    OverBet,
-    UnderBet,
-    TeamOverBet,
-    TeamUnderBet,
-    SpreadBet,
+    BET_CLASSES,
+    BetTypes,
     BetResults,
 )
-from espnquery import search_for_cfb_game_using_team_name
+from espnquery import search_for_cfb_game_using_team_name, ScoreboardIndex
 
+# One grammar for every bet type, with each alternative's outer group named after its BetTypes value.
+# The order of the alternatives matters! Because these patterns aren't super bullet proof,
+# spread technically can match team_over and team_under,
+# and team_over/team_under can technically match over/under.
+# The first alternative that matches the whole bet_str wins, same as the old if/elif chain.
+CFB_BET_STR_REGEX = re.compile(
+    r"^(?:"
+    r"(?P<moneyline>(?P<moneyline_team>.*?)\s+ML)"
+    r"|(?P<over>(?P<over_team>.+?)/(?P<over_opposing_team>.+?)\s+O\s+(?P<over_points>\d+\.\d))"
+    r"|(?P<under>(?P<under_team>.+?)/(?P<under_opposing_team>.+?)\s+U\s+(?P<under_points>\d+\.\d))"
+    r"|(?P<team_over>(?P<team_over_team>.*?)\s+TTP\s+O\s+(?P<team_over_points>\d*\.?\d*))"
+    r"|(?P<team_under>(?P<team_under_team>.*?)\s+TTP\s+U\s+(?P<team_under_points>\d*\.?\d*))"
+    r"|(?P<spread>(?P<spread_team>.*?)\s+(?P<spread_points>[+-]?\d*\.?\d+))"
+    r")$"
+)
 
-def str_to_cfb_bet(
-    bet_str: str,
+TEAM_BET_TYPES = {
+    BetTypes.MONEYLINE.value,
+    BetTypes.SPREAD.value,
+    BetTypes.TEAM_OVER.value,
+    BetTypes.TEAM_UNDER.value,
+}
+
+
+@dataclass
+class ParsedCfbBetStr:
+    bet_type: str
+    team_name: str
+    opposing_team_name: str = None
+    taking_points: float = None
+    taking_spread: float = None
+
+
+@dataclass
+class BetStrError:
+    path: list[str]
+    line_number: int
+    bet_str: str
+    message: str
+
+    def __str__(self):
+        return f"{' > '.join(self.path)} line {self.line_number}: {self.bet_str!r}: {self.message}"
+
+
+def parse_cfb_bet_str(bet_str: str) -> ParsedCfbBetStr:
+    match = CFB_BET_STR_REGEX.match(bet_str)
+    if match is None:
+        raise ValueError(f"Unrecognized bet_str {bet_str}")
+
+    bet_type = match.lastgroup
+    parsed_bet_str = ParsedCfbBetStr(
+        bet_type=bet_type,
+        team_name=match.group(f"{bet_type}_team"),
+    )
+    if bet_type in (BetTypes.OVER.value, BetTypes.UNDER.value):
+        parsed_bet_str.opposing_team_name = match.group(f"{bet_type}_opposing_team")
+    if bet_type == BetTypes.SPREAD.value:
+        parsed_bet_str.taking_spread = float(match.group("spread_points"))
+    elif bet_type != BetTypes.MONEYLINE.value:
+        parsed_bet_str.taking_points = float(match.group(f"{bet_type}_points"))
+    return parsed_bet_str
+
+
+def parsed_cfb_bet_str_to_bet(
+    parsed_bet_str: ParsedCfbBetStr,
     bettor: str,
     odds: int,
-    games_data: dict,
+    games_data: dict | ScoreboardIndex,
 ):
-    moneyline_regex = r"^(.*?)\s+ML$"
-    moneyline_match = re.match(moneyline_regex, bet_str)
-    over_regex = r"^(.+?)/(.+?)\s+O\s+(\d+\.\d)$"
-    over_match = re.match(over_regex, bet_str)
-    under_regex = r"^(.+?)/(.+?)\s+U\s+(\d+\.\d)$"
-    under_match = re.match(under_regex, bet_str)
-    spread_regex = r"^(.*?)\s+([+-]?\d*\.?\d+)$"
-    spread_match = re.match(spread_regex, bet_str)
-    team_over_regex = r"^(.*?)\s+TTP\s+O\s+(\d*\.?\d*)$"
-    team_over_match = re.match(team_over_regex, bet_str)
-    team_under_regex = r"^(.*?)\s+TTP\s+U\s+(\d*\.?\d*)$"
-    team_under_match = re.match(team_under_regex, bet_str)
-
-    # The order of the if elifs matter!
-    # Because these regexes weren't super bullet proof,
-    # spread_match technically can match team_over and team_under,
-    # and team_over/team_under can technically match over/under
-    opposing_team_name = None
-    if moneyline_match:
-        team_name = moneyline_match.group(1)
-    elif over_match:
-        team_name = over_match.group(1)
-        opposing_team_name = over_match.group(2)
-        taking_points = float(over_match.group(3))
-    elif under_match:
-        team_name = under_match.group(1)
-        opposing_team_name = under_match.group(2)
-        taking_points = float(under_match.group(3))
-    elif team_over_match:
-        team_name = team_over_match.group(1)
-        taking_points = float(team_over_match.group(2))
-    elif team_under_match:
-        team_name = team_under_match.group(1)
-        taking_points = float(team_under_match.group(2))
-    elif spread_match:
-        team_name = spread_match.group(1)
-        taking_spread = float(spread_match.group(2))
-    else:
-        raise ValueError(f"Unrecognized bet_str {bet_str}")
-
     game = search_for_cfb_game_using_team_name(
-        search_team_name=team_name,
+        search_team_name=parsed_bet_str.team_name,
         games_data=games_data,
-        search_opposing_team_name=opposing_team_name,
+        search_opposing_team_name=parsed_bet_str.opposing_team_name,
     )
 
-    if game is None:
-        raise ValueError(f"Unable to find a matching game for the bet_str {bet_str}")
-
-    if moneyline_match:
-        bet = MoneylineBet(
-            bettor=bettor,
-            game=game,
-            odds=odds,
-            result=BetResults.PENDING.value,
-            resulting_unit_profit=None,
-            taking_team=game.get_team(team_name),
-        )
-    elif over_match:
-        bet = OverBet(
-            bettor=bettor,
-            game=game,
-            odds=odds,
-            result=BetResults.PENDING.value,
-            resulting_unit_profit=None,
-            taking_points=taking_points,
-        )
-    elif under_match:
-        bet = UnderBet(
-            bettor=bettor,
-            game=game,
-            odds=odds,
-            result=BetResults.PENDING.value,
-            resulting_unit_profit=None,
-            taking_points=taking_points,
-        )
-    elif team_over_match:
-        bet = TeamOverBet(
-            bettor=bettor,
-            game=game,
-            odds=odds,
-            result=BetResults.PENDING.value,
-            resulting_unit_profit=None,
-            taking_team=game.get_team(team_name),
-            taking_points=taking_points,
-        )
-    elif team_under_match:
-        bet = TeamUnderBet(
-            bettor=bettor,
-            game=game,
-            odds=odds,
-            result=BetResults.PENDING.value,
-            resulting_unit_profit=None,
-            taking_team=game.get_team(team_name),
-            taking_points=taking_points,
-        )
-    elif spread_match:
-        bet = SpreadBet(
-            bettor=bettor,
-            game=game,
-            odds=odds,
-            result=BetResults.PENDING.value,
-            resulting_unit_profit=None,
-            taking_team=game.get_team(team_name),
-            taking_spread=taking_spread,
-        )
-    else:
-        raise ValueError(f"Unrecognized bet_str {bet_str}")
+    bet_kwargs = {
+        "bettor": bettor,
+        "game": game,
+        "odds": odds,
+        "result": BetResults.PENDING.value,
+        "resulting_unit_profit": None,
+    }
+    if parsed_bet_str.bet_type in TEAM_BET_TYPES:
+        bet_kwargs["taking_team"] = game.get_team(parsed_bet_str.team_name)
+    if parsed_bet_str.taking_points is not None:
+        bet_kwargs["taking_points"] = parsed_bet_str.taking_points
+    if parsed_bet_str.taking_spread is not None:
+        bet_kwargs["taking_spread"] = parsed_bet_str.taking_spread
 
+    bet = BET_CLASSES[parsed_bet_str.bet_type](**bet_kwargs)
     bet.evaluate()
     return bet
+
+
+def str_to_cfb_bet(
+    bet_str: str,
+    bettor: str,
+    odds: int,
+    games_data: dict | ScoreboardIndex,
+):
+    return parsed_cfb_bet_str_to_bet(
+        parsed_bet_str=parse_cfb_bet_str(bet_str),
+        bettor=bettor,
+        odds=odds,
+        games_data=games_data,
+    )
+
+
+def format_bet_str_errors(bet_str_errors: list[BetStrError]) -> str:
+    return f"{len(bet_str_errors)} bet(s) could not be read:\n" + "\n".join(
+        str(bet_str_error) for bet_str_error in bet_str_errors
+    )
@@ -1,23 +1,103 @@
 import requests
-from game import Game
+from game import Game, GameRegistry, game_registry
 from team import TeamInGame
 from datetime import datetime, timedelta
 from betgroup import BetGroup
-from bet import BetResults
+from bet import Bet, BetResults
+from metrics import metrics
+from teamalias import TeamAliasIndex
+from espnstream import parse_scoreboard_stream
+from scoreboardcache import ScoreboardCache, DEFAULT_MAX_FETCH_WORKERS, get_dates_in_range
 
 ESPN_API_BASE_URL = "http://site.api.espn.com/apis/site/v2/sports/football/college-football/scoreboard?dates="
+ESPN_API_TIMEOUT_SECONDS = 15
+ESPN_STREAM_CHUNK_BYTES = 64 * 1024
 
+# One keep-alive connection pool shared by every fetch, sized for the fetch workers
+espn_session = requests.Session()
+espn_session.mount(
+    "http://",
+    requests.adapters.HTTPAdapter(
+        pool_connections=1, pool_maxsize=DEFAULT_MAX_FETCH_WORKERS
+    ),
+)
 
-def query_cfb_games_data_for_dates(start_date: str, end_date: str = None) -> dict:
+
+def fetch_cfb_games_data_for_dates(start_date: str, end_date: str = None) -> dict:
     url = f"{ESPN_API_BASE_URL}{start_date}"
     if end_date is not None:
         url = f"{url}-{end_date}"
-    response = requests.get(url)
-    games_data = response.json()
+    response_bytes = 0
+
+    def iter_counted_chunks(response: requests.Response):
+        nonlocal response_bytes
+        for chunk in response.iter_content(chunk_size=ESPN_STREAM_CHUNK_BYTES):
+            response_bytes += len(chunk)
+            yield chunk
+
+    with metrics.timed("espn_fetch"):
+        with espn_session.get(url, timeout=ESPN_API_TIMEOUT_SECONDS, stream=True) as response:
+            response.raise_for_status()
+            # Parsed as it downloads, keeping only the fields event_to_game reads
+            games_data = parse_scoreboard_stream(iter_counted_chunks(response))
+    metrics.increment("espn_requests")
+    metrics.increment("espn_response_bytes", response_bytes)
 
     return games_data
 
 
+# Days are cached one at a time so a range only refetches days that can still change
+scoreboard_cache = ScoreboardCache(fetch_day=fetch_cfb_games_data_for_dates)
+
+
+def query_cfb_games_data_for_dates(start_date: str, end_date: str = None) -> dict:
+    return scoreboard_cache.get_dates(start_date, end_date)
+
+
+def merge_date_windows(date_windows: list[tuple[str, str]]) -> list[tuple[str, str]]:
+    sorted_windows = sorted(
+        (start_date, start_date if end_date is None else end_date)
+        for start_date, end_date in date_windows
+        if start_date is not None
+    )
+    merged_windows = []
+    for start_date, end_date in sorted_windows:
+        if len(merged_windows) > 0:
+            last_start_date, last_end_date = merged_windows[-1]
+            day_after_last_end_date = (
+                datetime.strptime(last_end_date, "%Y%m%d") + timedelta(days=1)
+            ).strftime("%Y%m%d")
+            if start_date <= day_after_last_end_date:
+                merged_windows[-1] = (last_start_date, max(last_end_date, end_date))
+                continue
+        merged_windows.append((start_date, end_date))
+    return merged_windows
+
+
+def pad_date_window(start_date: str, end_date: str = None, days: int = 1) -> tuple[str, str]:
+    if start_date is None:
+        return None, None
+    end_date = start_date if end_date is None else end_date
+    return (
+        (datetime.strptime(start_date, "%Y%m%d") - timedelta(days=days)).strftime("%Y%m%d"),
+        (datetime.strptime(end_date, "%Y%m%d") + timedelta(days=days)).strftime("%Y%m%d"),
+    )
+
+
+def query_cfb_games_data_for_date_windows(
+    date_windows: list[tuple[str, str]], max_workers: int = DEFAULT_MAX_FETCH_WORKERS
+) -> list[dict]:
+    all_dates = []
+    for start_date, end_date in merge_date_windows(date_windows):
+        all_dates.extend(get_dates_in_range(start_date, end_date))
+    scoreboard_cache.prefetch_dates(all_dates, max_workers=max_workers)
+
+    return [
+        None if start_date is None else query_cfb_games_data_for_dates(start_date, end_date)
+        for start_date, end_date in date_windows
+    ]
+
+
 def query_cfb_games_data_for_weekend(friday_date: str):
     friday_datetime = datetime.strptime(friday_date, "%Y%m%d")
     saturday_datetime = friday_datetime + timedelta(days=1)
@@ -26,106 +106,193 @@ def query_cfb_games_data_for_weekend(friday_date: str):
     return games_data
 
 
+def _get_team_names(team: dict) -> tuple[str, str, str]:
+    return team["displayName"], team["shortDisplayName"], team["abbreviation"]
+
+
+class ScoreboardIndex:
+    def __init__(self, games_data: dict, registry: GameRegistry = game_registry):
+        self.events = games_data["events"]
+        self.registry = registry
+        self.games: dict[int, Game] = {}
+        self.events_by_id: dict[str, int] = {}
+        # Keyed by full_name, every other spelling goes through the alias index first
+        self.events_by_team_name: dict[str, list[int]] = {}
+        self.events_by_team_names: dict[tuple[str, str], int] = {}
+        teams_names: dict[str, tuple[str, str, str]] = {}
+
+        for event_idx, event in enumerate(self.events):
+            if "id" in event:
+                self.events_by_id.setdefault(event["id"], event_idx)
+            competitors = event["competitions"][0]["competitors"]
+            competitor_names = [
+                _get_team_names(competitor["team"]) for competitor in competitors
+            ]
+            for team_names in competitor_names:
+                teams_names.setdefault(team_names[0], team_names)
+                self.events_by_team_name.setdefault(team_names[0], []).append(event_idx)
+            for i, team_names in enumerate(competitor_names):
+                for j, opposing_team_names in enumerate(competitor_names):
+                    if i != j:
+                        # First event wins, same as the old linear scan
+                        self.events_by_team_names.setdefault(
+                            (team_names[0], opposing_team_names[0]), event_idx
+                        )
+        self.team_alias_index = TeamAliasIndex(list(teams_names.values()))
+
+    def find_event_idx(self, search_team_name: str, search_opposing_team_name: str = None):
+        team_full_name = self.team_alias_index.resolve(search_team_name)
+        if team_full_name is None:
+            return None
+        if search_opposing_team_name is None:
+            event_idxs = self.events_by_team_name[team_full_name]
+            if len(event_idxs) > 1:
+                raise ValueError(
+                    f"{team_full_name} plays in {len(event_idxs)} games, name the opposing team too"
+                )
+            return event_idxs[0]
+        opposing_team_full_name = self.team_alias_index.resolve(search_opposing_team_name)
+        if opposing_team_full_name is None:
+            return None
+        return self.events_by_team_names.get((team_full_name, opposing_team_full_name))
+
+    def find_event(self, search_team_name: str, search_opposing_team_name: str = None):
+        event_idx = self.find_event_idx(search_team_name, search_opposing_team_name)
+        if event_idx is None:
+            return None
+        return self.events[event_idx]
+
+    def find_event_for_game(self, game: Game):
+        event_idx = None
+        if game.event_id is not None:
+            event_idx = self.events_by_id.get(game.event_id)
+        if event_idx is None:
+            event_idx = self.find_event_idx(game.teams[0].full_name, game.teams[1].full_name)
+        if event_idx is None:
+            return None
+        return self.events[event_idx]
+
+    def get_game(self, event_idx: int) -> Game:
+        if event_idx not in self.games:
+            game = event_to_game(self.events[event_idx])
+            shared_game = self.registry.register(game)
+            if shared_game is not game:
+                shared_game.update_from(game)
+            self.games[event_idx] = shared_game
+        return self.games[event_idx]
+
+    def search(self, search_team_name: str, search_opposing_team_name: str = None):
+        event_idx = self.find_event_idx(search_team_name, search_opposing_team_name)
+        if event_idx is None:
+            raise ValueError(f"Could not find a game for team: {search_team_name}/{search_opposing_team_name}")
+        return self.get_game(event_idx)
+
+
+def get_scoreboard_index(games_data: dict | ScoreboardIndex) -> ScoreboardIndex:
+    if isinstance(games_data, ScoreboardIndex):
+        return games_data
+    return ScoreboardIndex(games_data)
+
+
+def event_to_game(event: dict) -> Game:
+    competition = event["competitions"][0]
+    is_neutral_site = bool(competition["neutralSite"])
+    game_date = datetime.fromisoformat(
+        competition["date"].replace("Z", "+00:00")
+    ).strftime("%Y%m%d")
+
+    teams = []
+    is_over = False
+    for competitor in competition["competitors"]:
+        team_full_name, team_short_name, team_abbreviation = _get_team_names(competitor["team"])
+        team = TeamInGame.from_team_info(
+            full_name=team_full_name,
+            short_name=team_short_name,
+            abbreviation=team_abbreviation,
+            logo_url=competitor["team"]["logo"],
+            score=int(competitor["score"]),
+            is_home_team=True if competitor["homeAway"] == "home" else False,
+        )
+        teams.append(team)
+
+        if "winner" in competitor:
+            is_over = True
+
+    return Game(
+        teams=teams,
+        date=game_date,
+        is_over=is_over,
+        is_neutral_site=is_neutral_site,
+        event_id=event.get("id"),
+        start_time=competition["date"],
+    )
+
+
 def search_for_cfb_game_using_team_name(
-    search_team_name: str, games_data: dict, search_opposing_team_name: str = None
+    search_team_name: str,
+    games_data: dict | ScoreboardIndex,
+    search_opposing_team_name: str = None,
 ):
-    for event in games_data["events"]:
-        competition = event["competitions"][0]
-        is_neutral_site = bool(competition["neutralSite"])
-        competitors = competition["competitors"]
-        game_date = datetime.fromisoformat(
-            competition["date"].replace("Z", "+00:00")
-        ).strftime("%Y%m%d")
-
-        teams = []
-        is_game_found = False
-        is_over = False
-        search_team_found_in_game = False
-        search_opposing_team_found_in_game = False
-
-        for competitor in competitors:
-            team_full_name = competitor["team"]["displayName"]
-            team_short_name = competitor["team"]["shortDisplayName"]
-            team_abbreviation = competitor["team"]["abbreviation"]
-            team_logo_url = competitor["team"]["logo"]
-            team_score = int(competitor["score"])
-            team_is_home_team = True if competitor["homeAway"] == "home" else False
-
-            team = TeamInGame(
-                full_name=team_full_name,
-                short_name=team_short_name,
-                abbreviation=team_abbreviation,
-                logo_url=team_logo_url,
-                score=team_score,
-                is_home_team=team_is_home_team,
-            )
-            teams.append(team)
-
-            if "winner" in competitor:
-                is_over = True
-
-            # Found the game with the search team
-            if (
-                search_team_name == team_full_name
-                or search_team_name == team_short_name
-                or team_abbreviation == search_team_name
-            ):
-                search_team_found_in_game = True
-
-            if (
-                search_opposing_team_name == team_full_name
-                or search_opposing_team_name == team_short_name
-                or team_abbreviation == search_opposing_team_name
-            ):
-                search_opposing_team_found_in_game = True
-
-        if search_team_found_in_game:
-            if search_opposing_team_name is not None:
-                if search_opposing_team_found_in_game:
-                    is_game_found = True
-            else:
-                is_game_found = True
-
-        if is_game_found:
-            game = Game(
-                teams=teams,
-                date=game_date,
-                is_over=is_over,
-                is_neutral_site=is_neutral_site,
-            )
-            return game
-    raise ValueError(f"Could not find a game for team: {search_team_name}/{search_opposing_team_name}")
+    scoreboard_index = get_scoreboard_index(games_data)
+    return scoreboard_index.search(search_team_name, search_opposing_team_name)
 
 
-def update_cfb_game_score(game: Game, games_data: dict):
+def update_cfb_game_score(game: Game, games_data: dict | ScoreboardIndex) -> bool:
     search_team_name = game.teams[0].full_name
     search_opposing_team_name = game.teams[1].full_name
     game_date = game.date
 
-    updated_game = search_for_cfb_game_using_team_name(
-        search_team_name=search_team_name,
-        games_data=games_data,
-        search_opposing_team_name=search_opposing_team_name,
-    )
-    if updated_game is None:
+    scoreboard_index = get_scoreboard_index(games_data)
+    event = scoreboard_index.find_event_for_game(game)
+    if event is None:
         raise ValueError(f"Could not find a game with the teams {search_team_name} and {search_opposing_team_name} in games_data")
-    elif updated_game.date != game_date:
+    updated_game = event_to_game(event)
+    if updated_game.date != game_date:
         raise ValueError(
             f"Found a game in games_data with the teams {search_team_name} and {search_opposing_team_name}, but the found date was {updated_game.date}, not the {game_date} provided."
         )
-    else:
-        game.is_over = updated_game.is_over
-        for updated_team in updated_game.teams:
-            for team in game.teams:
-                if team.full_name == updated_team.full_name:
-                    team.score = updated_team.score
+    had_event_id = game.event_id is not None
+    is_changed = game.update_from(updated_game)
+    if not had_event_id and game.event_id is not None:
+        # It's registered under its date and teams, now the event's own game has to find it too
+        scoreboard_index.registry.register(game)
+    return is_changed
+
 
-def update_cfb_games_for_betgroup(betgroup: BetGroup, games_data: dict, only_pending: bool = True):
+def update_cfb_games_for_betgroup(
+    betgroup: BetGroup,
+    games_data: dict | ScoreboardIndex,
+    only_pending: bool = True,
+    updated_game_keys: set[str] = None,
+    changed_games: list[Game] = None,
+    changed_bets: list[Bet] = None,
+):
+    games_data = get_scoreboard_index(games_data)
+    if updated_game_keys is None:
+        updated_game_keys = set()
     if len(betgroup.bets) > 0:
         for bet in betgroup.bets:
             if only_pending and bet.result != BetResults.PENDING.value:
                 continue
-            update_cfb_game_score(bet.game, games_data)
+            # Bets share one Game per event, so each game only gets updated once
+            game_key = bet.game.get_key()
+            if game_key not in updated_game_keys:
+                updated_game_keys.add(game_key)
+                is_game_changed = update_cfb_game_score(bet.game, games_data)
+                if is_game_changed and changed_games is not None:
+                    changed_games.append(bet.game)
+            is_bet_changed = betgroup.evaluate_bet(bet)
+            if is_bet_changed and changed_bets is not None:
+                changed_bets.append(bet)
     else:
         for sub_betgroup in betgroup.sub_betgroups.values():
-            update_cfb_games_for_betgroup(sub_betgroup, games_data, only_pending=only_pending)
\ No newline at end of file
+            if only_pending and sub_betgroup.is_settled:
+                continue
+            update_cfb_games_for_betgroup(
+                sub_betgroup,
+                games_data,
+                only_pending=only_pending,
+                updated_game_keys=updated_game_keys,
+                changed_games=changed_games,
+                changed_bets=changed_bets,
+            )
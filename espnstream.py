@@ -0,0 +1,128 @@
+import codecs
+import json
+import re
+from typing import Iterable
+
+WHITESPACE_REGEX = re.compile(r"\s*")
+json_decoder = json.JSONDecoder()
+
+
+def compact_team(team: dict) -> dict:
+    return {
+        "displayName": team["displayName"],
+        "shortDisplayName": team["shortDisplayName"],
+        "abbreviation": team["abbreviation"],
+        "logo": team.get("logo"),
+    }
+
+
+def compact_competitor(competitor: dict) -> dict:
+    compacted_competitor = {
+        "homeAway": competitor["homeAway"],
+        "score": competitor["score"],
+        "team": compact_team(competitor["team"]),
+    }
+    # Only there once the game is over, and its presence is what says so
+    if "winner" in competitor:
+        compacted_competitor["winner"] = competitor["winner"]
+    return compacted_competitor
+
+
+def compact_event(event: dict) -> dict:
+    # Same shape as ESPN's event, minus the odds, broadcasts, venues, leaders, links etc.
+    # that nothing here reads
+    competition = event["competitions"][0]
+    compacted_event = {
+        "competitions": [
+            {
+                "date": competition["date"],
+                "neutralSite": competition["neutralSite"],
+                "competitors": [compact_competitor(competitor) for competitor in competition["competitors"]],
+            }
+        ]
+    }
+    if "id" in event:
+        compacted_event["id"] = event["id"]
+    return compacted_event
+
+
+class JsonChunkReader:
+    def __init__(self, chunks: Iterable[bytes]):
+        self.chunks = iter(chunks)
+        self.decoder = codecs.getincrementaldecoder("utf-8")()
+        self.buffer = ""
+        self.pos = 0
+        self.is_exhausted = False
+
+    def read_more(self) -> bool:
+        if self.is_exhausted:
+            return False
+        chunk = next(self.chunks, None)
+        if chunk is None:
+            self.is_exhausted = True
+            text = self.decoder.decode(b"", final=True)
+        else:
+            text = self.decoder.decode(chunk)
+        # Whatever has already been parsed gets dropped, so the buffer stays about one value long
+        self.buffer = self.buffer[self.pos :] + text
+        self.pos = 0
+        return True
+
+    def peek(self) -> str:
+        while True:
+            self.pos = WHITESPACE_REGEX.match(self.buffer, self.pos).end()
+            if self.pos < len(self.buffer):
+                return self.buffer[self.pos]
+            if not self.read_more():
+                return ""
+
+    def expect(self, char: str):
+        found_char = self.peek()
+        if found_char != char:
+            raise ValueError(f"Expected {char!r} in ESPN response at {self.pos}, found {found_char!r}")
+        self.pos += 1
+
+    def read_value(self):
+        self.peek()
+        while True:
+            try:
+                value, end = json_decoder.raw_decode(self.buffer, self.pos)
+                # A number right at the end of the buffer might still have digits coming
+                if end < len(self.buffer) or self.is_exhausted:
+                    self.pos = end
+                    return value
+            except json.JSONDecodeError:
+                if self.is_exhausted:
+                    raise
+            self.read_more()
+
+
+def parse_scoreboard_stream(chunks: Iterable[bytes]) -> dict:
+    # Walks the top level of the scoreboard, compacting events one at a time as they arrive
+    # and throwing away every other key, so the full payload is never in memory at once
+    reader = JsonChunkReader(chunks)
+    events = []
+    reader.expect("{")
+    if reader.peek() == "}":
+        return {"events": events}
+    while True:
+        key = reader.read_value()
+        reader.expect(":")
+        if key == "events":
+            reader.expect("[")
+            if reader.peek() == "]":
+                reader.pos += 1
+            else:
+                while True:
+                    events.append(compact_event(reader.read_value()))
+                    if reader.peek() != ",":
+                        break
+                    reader.pos += 1
+                reader.expect("]")
+        else:
+            reader.read_value()
+        if reader.peek() != ",":
+            break
+        reader.pos += 1
+    reader.expect("}")
+    return {"events": events}
@@ -0,0 +1,36 @@
+import threading
+from collections import OrderedDict
+from typing import Callable, Hashable
+from metrics import metrics
+
+DEFAULT_FRAGMENT_CACHE_SIZE = 20000
+
+
+class FragmentCache:
+    # Bounded LRU of rendered Dash components. Keys carry the versions of whatever the fragment
+    # shows, so a changed bet or betgroup simply misses and the stale entry ages out.
+    def __init__(self, maxsize: int = DEFAULT_FRAGMENT_CACHE_SIZE, metrics_name: str = "fragment_cache"):
+        self.maxsize = maxsize
+        self.metrics_name = metrics_name
+        self.fragments: OrderedDict[Hashable, object] = OrderedDict()
+        self.lock = threading.Lock()
+
+    def get_or_render(self, key: Hashable, render: Callable[[], object]):
+        with self.lock:
+            fragment = self.fragments.get(key)
+            if fragment is not None:
+                self.fragments.move_to_end(key)
+                metrics.increment(f"{self.metrics_name}_hits")
+                return fragment
+        metrics.increment(f"{self.metrics_name}_misses")
+        fragment = render()
+        with self.lock:
+            self.fragments[key] = fragment
+            self.fragments.move_to_end(key)
+            while len(self.fragments) > self.maxsize:
+                self.fragments.popitem(last=False)
+        return fragment
+
+    def clear(self):
+        with self.lock:
+            self.fragments.clear()
@@ -1,25 +1,104 @@
-from dataclasses import dataclass
+import threading
+import weakref
+from dataclasses import dataclass, field
+from datetime import datetime, timezone
+from slotstate import SlotsPickleMixin
 from team import TeamInGame
+from teamalias import get_team_alias_index
+from versioning import next_version
 
 
-@dataclass
-class Game:
+@dataclass(slots=True, weakref_slot=True)
+class Game(SlotsPickleMixin):
     teams: list[TeamInGame]
     date: str
     is_over: bool
     is_neutral_site: bool
+    event_id: str = None
+    start_time: str = None
+    # Goes up whenever the score or is_over changes, so rendered cards know when they're stale
+    _version: int = field(
+        default_factory=next_version, init=False, repr=False, compare=False, metadata={"pickle": False}
+    )
 
-    def get_team(self, team_name: str):
-        for team in self.teams:
+    def get_team_idx(self, team_name: str) -> int:
+        for i, team in enumerate(self.teams):
             if team.full_name == team_name or team.short_name == team_name or team.abbreviation == team_name:
-                return team
+                return i
+        # Bet strings don't always use one of ESPN's spellings
+        team_alias_index = get_team_alias_index(
+            tuple((team.full_name, team.short_name, team.abbreviation) for team in self.teams)
+        )
+        full_name = team_alias_index.resolve(team_name)
+        for i, team in enumerate(self.teams):
+            if team.full_name == full_name:
+                return i
         raise ValueError(f"Game does not contain team: {team_name}")
-    
+
+    def get_team(self, team_name: str):
+        return self.teams[self.get_team_idx(team_name)]
+
     def get_opposing_team(self, team_name: str):
-        for i, team in enumerate(self.teams):
-            if team.full_name == team_name or team.short_name == team_name or team.abbreviation == team_name:
-                if i == 0:
-                    return self.teams[1]
-                else:
-                    return self.teams[0]
-        raise ValueError(f"Game does not contain team: {team_name}")
\ No newline at end of file
+        if self.get_team_idx(team_name) == 0:
+            return self.teams[1]
+        return self.teams[0]
+
+    def get_key(self) -> str:
+        if self.event_id is not None:
+            return self.event_id
+        # Games pickled before event ids were kept
+        return self.get_legacy_key()
+
+    def get_legacy_key(self) -> str:
+        return "/".join([self.date] + [team.full_name for team in self.teams])
+
+    def get_start_datetime(self) -> datetime:
+        if self.start_time is not None:
+            return datetime.fromisoformat(self.start_time.replace("Z", "+00:00"))
+        # Games pickled before kickoff times were kept
+        return datetime.strptime(self.date, "%Y%m%d").replace(tzinfo=timezone.utc)
+
+    def update_from(self, updated_game: "Game") -> bool:
+        is_changed = self.is_over != updated_game.is_over
+        self.is_over = updated_game.is_over
+        if self.event_id is None:
+            self.event_id = updated_game.event_id
+        self.start_time = updated_game.start_time
+        for updated_team in updated_game.teams:
+            for team in self.teams:
+                if team.full_name == updated_team.full_name and team.score != updated_team.score:
+                    team.score = updated_team.score
+                    is_changed = True
+        if is_changed:
+            self._version = next_version()
+        return is_changed
+
+
+class GameRegistry:
+    def __init__(self):
+        # Weak, so games nothing uses anymore don't pile up in a long-running server
+        self.games: weakref.WeakValueDictionary[str, Game] = weakref.WeakValueDictionary()
+        # Ingest workers share a registry, the lookup and the adds have to happen as one
+        self.lock = threading.Lock()
+
+    def register(self, game: Game) -> Game:
+        # Games are findable by event id and by date and teams, so a game pickled before event ids
+        # were kept is still the one shared game for its event once it gets one.
+        # Registering a game again after it got its event id adds that key.
+        keys = [game.get_key()]
+        if game.event_id is not None:
+            keys.append(game.get_legacy_key())
+        with self.lock:
+            for key in keys:
+                registered_game = self.games.get(key)
+                if registered_game is not None:
+                    break
+            else:
+                registered_game = game
+            for key in keys:
+                self.games.setdefault(key, registered_game)
+        return registered_game
+
+
+# One Game instance per ESPN event, shared by every bet on it
+game_registry = GameRegistry()
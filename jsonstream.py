@@ -0,0 +1,90 @@
+from dataclasses import fields, is_dataclass
+from json.encoder import encode_basestring_ascii
+from typing import Callable, TextIO
+
+INFINITY = float("inf")
+
+
+def encode_float(value: float) -> str:
+    # Same spellings json.dumps uses
+    if value != value:
+        return "NaN"
+    if value == INFINITY:
+        return "Infinity"
+    if value == -INFINITY:
+        return "-Infinity"
+    return float.__repr__(value)
+
+
+def encode_scalar(value) -> str:
+    if isinstance(value, str):
+        return encode_basestring_ascii(value)
+    if value is None:
+        return "null"
+    if value is True:
+        return "true"
+    if value is False:
+        return "false"
+    if isinstance(value, int):
+        return int.__repr__(value)
+    if isinstance(value, float):
+        return encode_float(value)
+    raise TypeError(f"Object of type {type(value).__name__} is not JSON serializable")
+
+
+def write_items(
+    items: list[tuple[str, object]],
+    write: Callable[[str], int],
+    indent: int,
+    level: int,
+    opening: str,
+    closing: str,
+    is_object: bool,
+):
+    if len(items) == 0:
+        write(opening + closing)
+        return
+
+    write(opening)
+    if indent is None:
+        item_separator = ","
+        key_separator = ":"
+        closing_indent = ""
+    else:
+        item_separator = ",\n" + " " * (indent * (level + 1))
+        key_separator = ": "
+        closing_indent = "\n" + " " * (indent * level)
+        write("\n" + " " * (indent * (level + 1)))
+
+    for i, (key, value) in enumerate(items):
+        if i > 0:
+            write(item_separator)
+        if is_object:
+            write(encode_basestring_ascii(key))
+            write(key_separator)
+        write_value(value, write, indent, level + 1)
+    write(closing_indent + closing)
+
+
+def write_value(value, write: Callable[[str], int], indent: int = None, level: int = 0):
+    if hasattr(value, "get_json_items"):
+        write_items(value.get_json_items(), write, indent, level, "{", "}", is_object=True)
+    elif is_dataclass(value) and not isinstance(value, type):
+        # Walks the dataclass in place, the same shape asdict() would copy out.
+        # Underscored fields are in-memory links (parents, save state) and never serialized.
+        items = [
+            (field.name, getattr(value, field.name))
+            for field in fields(value)
+            if not field.name.startswith("_")
+        ]
+        write_items(items, write, indent, level, "{", "}", is_object=True)
+    elif isinstance(value, dict):
+        write_items(list(value.items()), write, indent, level, "{", "}", is_object=True)
+    elif isinstance(value, (list, tuple)):
+        write_items([(None, item) for item in value], write, indent, level, "[", "]", is_object=False)
+    else:
+        write(encode_scalar(value))
+
+
+def dump(obj, fp: TextIO, indent: int = None):
+    write_value(obj, fp.write, indent=indent)
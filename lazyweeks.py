@@ -0,0 +1,186 @@
+import copy
+import json
+import os
+import threading
+from dataclasses import asdict, dataclass
+from typing import Callable, Iterator, Mapping
+from atomicfile import atomic_open
+from betgroup import BetGroup
+from betstore import BetStore
+from game import GameRegistry, game_registry
+
+# Written next to the weeks after every refresh, so a restart can draw every week's header
+# without unpickling any of them
+BETGROUP_SUMMARIES_FILENAME = ".summaries.json"
+
+
+@dataclass
+class BetGroupSummary:
+    # Just what a collapsed header shows, plus what the refresher needs to skip settled weeks
+    group_name: str
+    hits: int
+    misses: int
+    pushes: int
+    pendings: int
+    profit: float
+    is_settled: bool
+    # The source file as of the summary, a summary for a since-rewritten file is ignored
+    source_mtime_ns: int = None
+    source_size: int = None
+
+    @staticmethod
+    def from_betgroup(betgroup: BetGroup, source_filepath: str = None) -> "BetGroupSummary":
+        summary = BetGroupSummary(
+            group_name=betgroup.group_name,
+            hits=betgroup.hits,
+            misses=betgroup.misses,
+            pushes=betgroup.pushes,
+            pendings=betgroup.pendings,
+            profit=betgroup.profit,
+            is_settled=betgroup.is_settled,
+        )
+        if source_filepath is not None and os.path.exists(source_filepath):
+            source_stat = os.stat(source_filepath)
+            summary.source_mtime_ns = source_stat.st_mtime_ns
+            summary.source_size = source_stat.st_size
+        return summary
+
+    def is_current_for(self, source_filepath: str) -> bool:
+        try:
+            source_stat = os.stat(source_filepath)
+        except OSError:
+            return False
+        return (self.source_mtime_ns, self.source_size) == (source_stat.st_mtime_ns, source_stat.st_size)
+
+
+def load_betgroup_summaries(bets_folder: str) -> dict[str, BetGroupSummary]:
+    try:
+        with open(os.path.join(bets_folder, BETGROUP_SUMMARIES_FILENAME)) as f:
+            return {key: BetGroupSummary(**summary) for key, summary in json.load(f).items()}
+    except (OSError, ValueError, TypeError):
+        return {}
+
+
+def save_betgroup_summaries(bets_folder: str, summaries: dict[str, BetGroupSummary]):
+    with atomic_open(os.path.join(bets_folder, BETGROUP_SUMMARIES_FILENAME)) as f:
+        json.dump({key: asdict(summary) for key, summary in summaries.items()}, f, indent=4)
+
+
+class LazyBetGroups(Mapping):
+    # Each week is only loaded the first time something asks for it.
+    # loaders get the GameRegistry to share the week's games through.
+    def __init__(
+        self,
+        loaders: dict[str, Callable[[GameRegistry], BetGroup]],
+        summaries: dict[str, BetGroupSummary] = None,
+        loaded: dict[str, BetGroup] = None,
+        registry: GameRegistry = game_registry,
+    ):
+        self.loaders = loaders
+        self.summaries = {} if summaries is None else summaries
+        self.loaded = {} if loaded is None else loaded
+        self.registry = registry
+        self.lock = threading.RLock()
+
+    def __getitem__(self, key: str) -> BetGroup:
+        betgroup = self.loaded.get(key)
+        if betgroup is not None:
+            return betgroup
+        with self.lock:
+            if key not in self.loaded:
+                self.loaded[key] = self.loaders[key](self.registry)
+            return self.loaded[key]
+
+    def __iter__(self) -> Iterator[str]:
+        return iter(self.loaders)
+
+    def __len__(self) -> int:
+        return len(self.loaders)
+
+    def is_loaded(self, key: str) -> bool:
+        return key in self.loaded
+
+    def get_header(self, key: str) -> BetGroup | BetGroupSummary:
+        # The summary stands in for a week nobody has opened yet
+        if key not in self.loaded and key in self.summaries:
+            return self.summaries[key]
+        return self[key]
+
+    def get_summaries(self, source_filepaths: dict[str, str] = None) -> dict[str, BetGroupSummary]:
+        with self.lock:
+            summaries = dict(self.summaries)
+            for key, betgroup in self.loaded.items():
+                source_filepath = None if source_filepaths is None else source_filepaths.get(key)
+                summaries[key] = BetGroupSummary.from_betgroup(betgroup, source_filepath)
+            return summaries
+
+    def unload(self, key: str, source_filepath: str = None):
+        # Its summary stands in for it again, until something asks for the week itself
+        with self.lock:
+            betgroup = self.loaded.pop(key, None)
+            if betgroup is not None:
+                self.summaries[key] = BetGroupSummary.from_betgroup(betgroup, source_filepath)
+
+    def copy_for_snapshot(self, previous: "LazyBetGroups" = None) -> "LazyBetGroups":
+        # Loaded weeks get one deepcopy for all of them so games shared between weeks stay shared.
+        # Weeks still on disk get loaded into the copy's own registry if a reader ever asks.
+        with self.lock:
+            loaded = copy.deepcopy(self.loaded)
+            summaries = self.get_summaries()
+        if previous is not None:
+            # Weeks this one doesn't have loaded haven't changed since the last snapshot,
+            # so whatever copy of them that snapshot has is still good
+            with previous.lock:
+                for key, betgroup in previous.loaded.items():
+                    if key in self.loaders and key not in loaded:
+                        loaded[key] = betgroup
+        return LazyBetGroups(
+            self.loaders,
+            summaries=summaries,
+            loaded=loaded,
+            registry=GameRegistry(),
+        )
+
+
+def load_lazy_betgroups_from_disk(bets_folder: str) -> LazyBetGroups:
+    loaders = {}
+    for root, dirs, files in os.walk(bets_folder):
+        for file in files:
+            if file.endswith(".bets"):
+                filepath = os.path.join(root, file)
+                loaders[filepath] = lambda registry, filepath=filepath: BetGroup.load_from_disk(
+                    filepath, registry
+                )
+    summaries = {
+        filepath: summary
+        for filepath, summary in load_betgroup_summaries(bets_folder).items()
+        if filepath in loaders and summary.is_current_for(filepath)
+    }
+    return LazyBetGroups(loaders, summaries=summaries)
+
+
+def load_lazy_betgroups_from_store(bet_store: BetStore) -> LazyBetGroups:
+    # The betgroups table already has every week's totals, no summaries file needed
+    loaders = {}
+    summaries = {}
+    for betgroup_row in bet_store.list_betgroups():
+        source_path = betgroup_row["source_path"]
+        loaders[source_path] = lambda registry, source_path=source_path: bet_store.load_betgroup(
+            source_path, None if registry is bet_store.registry else registry
+        )
+        summaries[source_path] = BetGroupSummary(
+            group_name=betgroup_row["group_name"],
+            hits=betgroup_row["hits"],
+            misses=betgroup_row["misses"],
+            pushes=betgroup_row["pushes"],
+            pendings=betgroup_row["pendings"],
+            profit=betgroup_row["profit"],
+            is_settled=bool(betgroup_row["is_settled"]),
+        )
+    return LazyBetGroups(loaders, summaries=summaries, registry=bet_store.registry)
+
+
+def get_betgroup_header(betgroups: Mapping[str, BetGroup], key: str) -> BetGroup | BetGroupSummary:
+    if isinstance(betgroups, LazyBetGroups):
+        return betgroups.get_header(key)
+    return betgroups[key]
@@ -0,0 +1,353 @@
+import bisect
+import copy
+import itertools
+import json
+import os
+import threading
+from dataclasses import astuple, dataclass
+from typing import Iterable, Mapping
+from atomicfile import atomic_open
+from bet import Bet, BetResults
+from betgroup import BetGroup, bet_result_listeners
+
+# Each leaderboard is keyed by one or more of these. The last one is what gets ranked,
+# the ones before it pick which leaderboard, e.g. bettor_by_bet_type ("spread",) ranks bettors on spreads.
+# team counts every bet on a game the team played in.
+LEADERBOARD_DIMENSIONS = {
+    "bettor": ("bettor",),
+    "show": ("show",),
+    "bet_type": ("bet_type",),
+    "team": ("team",),
+    "week": ("week",),
+    "bettor_by_bet_type": ("bet_type", "bettor"),
+    "bettor_by_team": ("team", "bettor"),
+    "bettor_by_week": ("week", "bettor"),
+}
+# Written next to the weeks after every refresh, so a restart can fill in the leaderboards
+# without unpickling any week
+WEEK_ROLLUPS_FILENAME = ".leaderboards.json"
+
+Rollups = dict[str, dict[tuple, dict[str, "Standing"]]]
+
+
+@dataclass
+class Standing:
+    hits: int = 0
+    misses: int = 0
+    pushes: int = 0
+    pendings: int = 0
+    profit: float = 0.0
+
+    def count_result(self, result: str, profit: float, sign: int):
+        if result == BetResults.HIT.value:
+            self.hits += sign
+        elif result == BetResults.MISS.value:
+            self.misses += sign
+        elif result == BetResults.PUSH.value:
+            self.pushes += sign
+        else:
+            self.pendings += sign
+        self.profit += sign * profit
+
+    def add(self, other: "Standing", sign: int):
+        self.hits += sign * other.hits
+        self.misses += sign * other.misses
+        self.pushes += sign * other.pushes
+        self.pendings += sign * other.pendings
+        self.profit += sign * other.profit
+
+    def get_num_bets(self) -> int:
+        return self.hits + self.misses + self.pushes + self.pendings
+
+    @staticmethod
+    def from_result(result: str, profit: float) -> "Standing":
+        standing = Standing()
+        standing.count_result(result, profit, 1)
+        return standing
+
+
+def get_root_and_show(bet: Bet) -> tuple[BetGroup, str]:
+    # week > show > ... > bettor, so the show is whatever sits right under the root
+    betgroup = bet._betgroup
+    show_betgroup = None
+    while betgroup._parent is not None:
+        show_betgroup = betgroup
+        betgroup = betgroup._parent
+    return betgroup, show_betgroup.group_name if show_betgroup is not None else None
+
+
+def get_bet_keys(bet: Bet, root: BetGroup, show: str) -> dict[str, list[str]]:
+    return {
+        "bettor": [bet.bettor],
+        "show": [show] if show is not None else [],
+        "bet_type": [bet.bet_type],
+        "team": [team.full_name for team in bet.game.teams],
+        "week": [root.group_name],
+    }
+
+
+def new_rollups() -> Rollups:
+    return {dimension: {} for dimension in LEADERBOARD_DIMENSIONS}
+
+
+def add_to_rollup(rollup: dict[tuple, dict[str, Standing]], prefix: tuple, value: str, change: Standing, sign: int):
+    standings = rollup.setdefault(prefix, {})
+    standing = standings.setdefault(value, Standing())
+    standing.add(change, sign)
+    # Nothing left on it, e.g. its bets were uncounted
+    if standing.get_num_bets() <= 0:
+        del standings[value]
+        if len(standings) == 0:
+            del rollup[prefix]
+
+
+def encode_rollups(rollups: Rollups) -> dict:
+    return {
+        dimension: [
+            [list(prefix), value, *astuple(standing)]
+            for prefix, standings in rollup.items()
+            for value, standing in standings.items()
+        ]
+        for dimension, rollup in rollups.items()
+    }
+
+
+def decode_rollups(encoded_rollups: dict) -> Rollups:
+    rollups = new_rollups()
+    for dimension, rows in encoded_rollups.items():
+        for prefix, value, *standing in rows:
+            rollups[dimension].setdefault(tuple(prefix), {})[value] = Standing(*standing)
+    return rollups
+
+
+def get_source_stat(source_filepath: str) -> tuple[int, int]:
+    try:
+        source_stat = os.stat(source_filepath)
+    except OSError:
+        return None
+    return source_stat.st_mtime_ns, source_stat.st_size
+
+
+def load_week_rollups(bets_folder: str, source_filepaths: dict[str, str]) -> dict[str, Rollups]:
+    # Rollups for a since-rewritten week are ignored, that week gets counted from the week itself
+    try:
+        with open(os.path.join(bets_folder, WEEK_ROLLUPS_FILENAME)) as f:
+            saved_weeks = json.load(f)
+    except (OSError, ValueError):
+        return {}
+    week_rollups = {}
+    for key, saved_week in saved_weeks.items():
+        if key not in source_filepaths:
+            continue
+        source_stat = get_source_stat(source_filepaths[key])
+        if source_stat is None or source_stat != (saved_week["source_mtime_ns"], saved_week["source_size"]):
+            continue
+        try:
+            week_rollups[key] = decode_rollups(saved_week["rollups"])
+        except (KeyError, TypeError, ValueError):
+            continue
+    return week_rollups
+
+
+def save_week_rollups(bets_folder: str, week_rollups: dict[str, Rollups], source_filepaths: dict[str, str]):
+    saved_weeks = {}
+    for key, rollups in week_rollups.items():
+        source_stat = get_source_stat(source_filepaths.get(key, key))
+        if source_stat is None:
+            continue
+        saved_weeks[key] = {
+            "source_mtime_ns": source_stat[0],
+            "source_size": source_stat[1],
+            "rollups": encode_rollups(rollups),
+        }
+    with atomic_open(os.path.join(bets_folder, WEEK_ROLLUPS_FILENAME)) as f:
+        json.dump(saved_weeks, f)
+
+
+class Leaderboards:
+    def __init__(self, betgroups: Mapping[str, BetGroup] = None):
+        # dimension name -> key prefix -> ranked value -> Standing, summed over every week
+        self.rollups: Rollups = new_rollups()
+        # dimension name -> key prefix -> (-profit, value) of every standing, kept sorted as results
+        # come in so reading a top N never sorts
+        self.rankings: dict[str, dict[tuple, list[tuple[float, str]]]] = {
+            dimension: {} for dimension in LEADERBOARD_DIMENSIONS
+        }
+        # week key -> that week's own rollups. They're what gets saved, so a settled week never
+        # has to be loaded again just to be counted.
+        self.week_rollups: dict[str, Rollups] = {}
+        # id(root) -> (week key, root) for the loaded weeks whose result changes get counted as they happen
+        self.tracked_roots: dict[int, tuple[str, BetGroup]] = {}
+        # Goes up whenever any standing changes
+        self.version = 0
+        self.lock = threading.Lock()
+        for key, betgroup in (betgroups or {}).items():
+            self.add_betgroup(key, betgroup)
+
+    @staticmethod
+    def from_rollups(rollups: Rollups) -> "Leaderboards":
+        # Read-only copy for a process that isn't evaluating anything, no weeks are kept
+        leaderboards = Leaderboards()
+        leaderboards.rollups = rollups
+        for dimension, rollup in rollups.items():
+            leaderboards.rankings[dimension] = {
+                prefix: sorted((-standing.profit, value) for value, standing in standings.items())
+                for prefix, standings in rollup.items()
+            }
+        return leaderboards
+
+    def get_rollups(self) -> Rollups:
+        with self.lock:
+            return copy.deepcopy(self.rollups)
+
+    def get_week_rollups(self) -> dict[str, Rollups]:
+        with self.lock:
+            return copy.deepcopy(self.week_rollups)
+
+    def listen(self):
+        bet_result_listeners.append(self.on_bet_result_changed)
+
+    def has_week(self, key: str) -> bool:
+        return key in self.week_rollups
+
+    def get_num_weeks(self) -> int:
+        return len(self.week_rollups)
+
+    def clear(self):
+        with self.lock:
+            self.rollups = new_rollups()
+            self.rankings = {dimension: {} for dimension in LEADERBOARD_DIMENSIONS}
+            self.week_rollups = {}
+            self.tracked_roots = {}
+            self.version += 1
+
+    def add_to_total(self, dimension: str, prefix: tuple, value: str, change: Standing, sign: int):
+        ranking = self.rankings[dimension].setdefault(prefix, [])
+        standing = self.rollups[dimension].get(prefix, {}).get(value)
+        if standing is not None:
+            del ranking[bisect.bisect_left(ranking, (-standing.profit, value))]
+        add_to_rollup(self.rollups[dimension], prefix, value, change, sign)
+        standing = self.rollups[dimension].get(prefix, {}).get(value)
+        if standing is not None:
+            bisect.insort(ranking, (-standing.profit, value))
+        elif len(ranking) == 0:
+            del self.rankings[dimension][prefix]
+
+    def count_bet_keys(self, key: str, bet_keys: dict[str, list[str]], change: Standing, sign: int):
+        week_rollups = self.week_rollups.setdefault(key, new_rollups())
+        for dimension, key_names in LEADERBOARD_DIMENSIONS.items():
+            for bet_key in itertools.product(*(bet_keys[key_name] for key_name in key_names)):
+                add_to_rollup(week_rollups[dimension], bet_key[:-1], bet_key[-1], change, sign)
+                self.add_to_total(dimension, bet_key[:-1], bet_key[-1], change, sign)
+        self.version += 1
+
+    def count_betgroup(self, key: str, root: BetGroup, betgroup: BetGroup, show: str):
+        for bet in betgroup.bets:
+            self.count_bet_keys(
+                key, get_bet_keys(bet, root, show), Standing.from_result(bet.result, bet.resulting_unit_profit), 1
+            )
+        for sub_name, sub_betgroup in betgroup.sub_betgroups.items():
+            self.count_betgroup(key, root, sub_betgroup, sub_name if show is None else show)
+
+    def add_betgroup(self, key: str, betgroup: BetGroup, track: bool = True):
+        # A week that's already counted (e.g. from its saved rollups) only gets tracked
+        with self.lock:
+            if key not in self.week_rollups:
+                self.week_rollups[key] = new_rollups()
+                self.count_betgroup(key, betgroup, betgroup, None)
+            if track:
+                self.untrack_locked(key)
+                self.tracked_roots[id(betgroup)] = (key, betgroup)
+
+    def add_week_rollups(self, key: str, rollups: Rollups):
+        with self.lock:
+            if key in self.week_rollups:
+                return
+            self.week_rollups[key] = rollups
+            for dimension, rollup in rollups.items():
+                for prefix, standings in rollup.items():
+                    for value, standing in standings.items():
+                        self.add_to_total(dimension, prefix, value, standing, 1)
+            self.version += 1
+
+    def add_bet_rows(self, bet_rows: Iterable[Mapping], keys: Iterable[str] = ()):
+        # Rows from BetStore.query_leaderboard_bets, one per team of each bet's game
+        with self.lock:
+            for key in keys:
+                self.week_rollups.setdefault(key, new_rollups())
+            for _, rows in itertools.groupby(bet_rows, key=lambda row: row["bet_id"]):
+                rows = list(rows)
+                row = rows[0]
+                bet_keys = {
+                    "bettor": [row["bettor"]],
+                    "show": [row["show"]] if row["show"] is not None else [],
+                    "bet_type": [row["bet_type"]],
+                    "team": [team_row["team"] for team_row in rows],
+                    "week": [row["week"]],
+                }
+                self.count_bet_keys(
+                    row["source_path"],
+                    bet_keys,
+                    Standing.from_result(row["result"], row["resulting_unit_profit"]),
+                    1,
+                )
+
+    def untrack(self, key: str):
+        with self.lock:
+            self.untrack_locked(key)
+
+    def untrack_locked(self, key: str):
+        for root_id, (tracked_key, _) in list(self.tracked_roots.items()):
+            if tracked_key == key:
+                del self.tracked_roots[root_id]
+
+    def remove_week(self, key: str):
+        with self.lock:
+            self.untrack_locked(key)
+            rollups = self.week_rollups.pop(key, None)
+            if rollups is None:
+                return
+            for dimension, rollup in rollups.items():
+                for prefix, standings in rollup.items():
+                    for value, standing in standings.items():
+                        self.add_to_total(dimension, prefix, value, standing, -1)
+            self.version += 1
+
+    def on_bet_result_changed(self, bet: Bet, old_result: str, old_profit: float):
+        if bet._betgroup is None:
+            return
+        root, show = get_root_and_show(bet)
+        # Copies of the trees (snapshots, benchmarks) aren't counted here
+        tracked_root = self.tracked_roots.get(id(root))
+        if tracked_root is None or tracked_root[1] is not root:
+            return
+        bet_keys = get_bet_keys(bet, root, show)
+        with self.lock:
+            self.count_bet_keys(tracked_root[0], bet_keys, Standing.from_result(old_result, old_profit), -1)
+            self.count_bet_keys(
+                tracked_root[0], bet_keys, Standing.from_result(bet.result, bet.resulting_unit_profit), 1
+            )
+
+    def get_standing(self, dimension: str, *key: str) -> Standing:
+        with self.lock:
+            standing = self.rollups[dimension].get(key[:-1], {}).get(key[-1])
+            return copy.copy(standing) if standing is not None else Standing()
+
+    def get_prefixes(self, dimension: str) -> list[tuple]:
+        with self.lock:
+            return sorted(self.rollups[dimension])
+
+    def get_leaderboard(self, dimension: str, prefix: tuple = (), limit: int = None) -> list[tuple[str, Standing]]:
+        # Mixing e.g. every bet type's bettors into one list would rank the same bettor several times
+        if len(prefix) != len(LEADERBOARD_DIMENSIONS[dimension]) - 1:
+            raise ValueError(
+                f"Leaderboard {dimension} needs a prefix of {LEADERBOARD_DIMENSIONS[dimension][:-1]}, got {prefix}"
+            )
+        # Reads the top of a ranking that's already sorted, so it doesn't grow with history
+        with self.lock:
+            standings = self.rollups[dimension].get(prefix, {})
+            ranking = self.rankings[dimension].get(prefix, [])
+            return [
+                (value, copy.copy(standings[value]))
+                for _, value in (ranking if limit is None else ranking[:limit])
+            ]
@@ -0,0 +1,89 @@
+from contextlib import contextmanager, nullcontext
+import bisect
+import os
+import threading
+import time
+
+METRICS_PREFIX = "cfb"
+LATENCY_BUCKETS_SECONDS = [0.001, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0]
+
+# Shared, reusable no-op so a disabled timed() costs one attribute check
+NO_OP_CONTEXT = nullcontext()
+
+
+class Histogram:
+    def __init__(self, buckets: list[float] = LATENCY_BUCKETS_SECONDS):
+        self.buckets = buckets
+        # One extra slot for +Inf
+        self.bucket_counts = [0] * (len(buckets) + 1)
+        self.count = 0
+        self.sum = 0.0
+
+    def observe(self, value: float):
+        self.bucket_counts[bisect.bisect_left(self.buckets, value)] += 1
+        self.count += 1
+        self.sum += value
+
+
+class Metrics:
+    def __init__(self, enabled: bool = True):
+        self.enabled = enabled
+        self.counters: dict[str, float] = {}
+        self.histograms: dict[str, Histogram] = {}
+        self.lock = threading.Lock()
+
+    def increment(self, name: str, amount: float = 1):
+        if not self.enabled:
+            return
+        with self.lock:
+            self.counters[name] = self.counters.get(name, 0) + amount
+
+    def observe(self, stage: str, seconds: float):
+        if not self.enabled:
+            return
+        with self.lock:
+            if stage not in self.histograms:
+                self.histograms[stage] = Histogram()
+            self.histograms[stage].observe(seconds)
+
+    @contextmanager
+    def _timed(self, stage: str):
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.observe(stage, time.perf_counter() - start)
+
+    def timed(self, stage: str):
+        if not self.enabled:
+            return NO_OP_CONTEXT
+        return self._timed(stage)
+
+    def render_prometheus(self) -> str:
+        with self.lock:
+            counters = dict(self.counters)
+            histograms = {
+                stage: (list(histogram.bucket_counts), histogram.count, histogram.sum, histogram.buckets)
+                for stage, histogram in self.histograms.items()
+            }
+
+        lines = []
+        for name, value in sorted(counters.items()):
+            metric_name = f"{METRICS_PREFIX}_{name}_total"
+            lines.append(f"# TYPE {metric_name} counter")
+            lines.append(f"{metric_name} {value}")
+
+        metric_name = f"{METRICS_PREFIX}_stage_duration_seconds"
+        if len(histograms) > 0:
+            lines.append(f"# TYPE {metric_name} histogram")
+        for stage, (bucket_counts, count, total, buckets) in sorted(histograms.items()):
+            cumulative_count = 0
+            for upper_bound, bucket_count in zip(buckets + ["+Inf"], bucket_counts):
+                cumulative_count += bucket_count
+                lines.append(f'{metric_name}_bucket{{stage="{stage}",le="{upper_bound}"}} {cumulative_count}')
+            lines.append(f'{metric_name}_sum{{stage="{stage}"}} {total}')
+            lines.append(f'{metric_name}_count{{stage="{stage}"}} {count}')
+        return "\n".join(lines) + "\n"
+
+
+metrics = Metrics(enabled=os.environ.get("CFB_METRICS_ENABLED", "1") != "0")
@@ -1,37 +1,80 @@
+import argparse
+import hashlib
 import json
-from convenience import str_to_cfb_bet
-from espnquery import query_cfb_games_data_for_weekend
-from dataclasses import asdict
+import time
+from concurrent.futures import ThreadPoolExecutor
+from convenience import str_to_cfb_bet, BetStrError, format_bet_str_errors
+from espnquery import query_cfb_games_data_for_weekend, ScoreboardIndex
+from dataclasses import asdict, dataclass, field
 from betgroup import BetGroup
+from betstore import BETS_DB_FILENAME, BetStore
+from atomicfile import atomic_open
+from scoreboardcache import DEFAULT_MAX_FETCH_WORKERS
 import pickle
 import os
+import requests
+import sqlite3
+
+DEFAULT_BETS_ROOT = os.path.join(os.path.dirname(os.path.abspath(__file__)), "bets")
+WEEK_INPUT_FILENAME = "input.json"
+WEEK_OUTPUT_BETS_FILENAME = "output.bets"
+WEEK_OUTPUT_JSON_FILENAME = "output.json"
+# Sidecar remembering what the outputs were built from, so unchanged weeks can be skipped
+WEEK_OUTPUT_META_FILENAME = "output.meta.json"
 
 
 def read_cfb_week_bets_input(week_bets_filepath: str):
+    week_bets, bet_str_errors = read_cfb_week_bets_input_with_errors(week_bets_filepath)
+    if len(bet_str_errors) > 0:
+        raise ValueError(format_bet_str_errors(bet_str_errors))
+    return week_bets
+
+
+def read_cfb_week_bets_input_with_errors(week_bets_filepath: str) -> tuple[BetGroup, list[BetStrError]]:
     with open(week_bets_filepath) as week_bets_file:
         week_bets_input = json.load(week_bets_file)
-        cfb_friday = week_bets_input["cfb_friday"]
-        games_data = query_cfb_games_data_for_weekend(cfb_friday)
+    return parse_cfb_week_bets_input(week_bets_filepath, week_bets_input)
 
-        week_bets = BetGroup(group_name=os.path.basename(os.path.dirname(week_bets_filepath)))
 
-        for show_name, show_bets in week_bets_input["shows"].items():
-            week_bets.new_sub_betgroup(
-                get_bets_in_category(
-                    bet_category_name=show_name,
-                    bet_category_contents=show_bets,
-                    games_data=games_data,
-                )
+def parse_cfb_week_bets_input(
+    week_bets_filepath: str, week_bets_input: dict
+) -> tuple[BetGroup, list[BetStrError]]:
+    cfb_friday = week_bets_input["cfb_friday"]
+    games_data = ScoreboardIndex(query_cfb_games_data_for_weekend(cfb_friday))
+    return parse_cfb_week_bets(
+        group_name=os.path.basename(os.path.dirname(week_bets_filepath)),
+        shows=week_bets_input["shows"],
+        games_data=games_data,
+    )
+
+
+def parse_cfb_week_bets(
+    group_name: str, shows: dict[str, dict], games_data: ScoreboardIndex
+) -> tuple[BetGroup, list[BetStrError]]:
+    bet_str_errors = []
+    week_bets = BetGroup(group_name=group_name)
+
+    for show_name, show_bets in shows.items():
+        week_bets.new_sub_betgroup(
+            get_bets_in_category(
+                bet_category_name=show_name,
+                bet_category_contents=show_bets,
+                games_data=games_data,
+                bet_str_errors=bet_str_errors,
             )
-        week_bets.evaluate()
-        return week_bets
+        )
+    week_bets.evaluate()
+    return week_bets, bet_str_errors
 
 
 def get_bets_in_category(
     bet_category_name: str,
     bet_category_contents: dict[str, dict] | list[tuple[str, int]],
-    games_data: dict,
+    games_data: ScoreboardIndex,
+    bet_str_errors: list[BetStrError] = None,
+    path: list[str] = None,
 ):
+    path = [bet_category_name] if path is None else path + [bet_category_name]
     return_betgroup = BetGroup(group_name=bet_category_name)
     if isinstance(bet_category_contents, dict):
         for key, value in bet_category_contents.items():
@@ -40,6 +83,8 @@ def get_bets_in_category(
                     bet_category_name=key,
                     bet_category_contents=value,
                     games_data=games_data,
+                    bet_str_errors=bet_str_errors,
+                    path=path,
                 )
             )
     elif isinstance(
@@ -47,10 +92,19 @@ def get_bets_in_category(
     ):  # leaf node, it's individual bets here
         bettor = bet_category_name
 
-        for bet_str, odds in bet_category_contents:
-            bet = str_to_cfb_bet(
-                bet_str=bet_str, bettor=bettor, odds=odds, games_data=games_data
-            )
+        for line_number, (bet_str, odds) in enumerate(bet_category_contents, start=1):
+            try:
+                bet = str_to_cfb_bet(
+                    bet_str=bet_str, bettor=bettor, odds=odds, games_data=games_data
+                )
+            except ValueError as e:
+                # Without an error list, keep the old stop-at-the-first-error behavior
+                if bet_str_errors is None:
+                    raise
+                bet_str_errors.append(
+                    BetStrError(path=path, line_number=line_number, bet_str=bet_str, message=str(e))
+                )
+                continue
             return_betgroup.new_bet(bet)
     else:
         raise ValueError("bet_category_contents must be dict or list")
@@ -58,15 +112,189 @@ def get_bets_in_category(
     return return_betgroup
 
 
+@dataclass
+class WeekIngestResult:
+    week_bets_filepath: str
+    status: str
+    seconds: float
+    num_bets: int = 0
+    bet_str_errors: list[BetStrError] = field(default_factory=list)
+    message: str = None
+
+
+def find_cfb_week_bets_inputs(bets_root: str) -> list[str]:
+    week_bets_filepaths = []
+    for root, dirs, files in os.walk(bets_root):
+        if WEEK_INPUT_FILENAME in files:
+            week_bets_filepaths.append(os.path.join(root, WEEK_INPUT_FILENAME))
+    return sorted(week_bets_filepaths)
+
+
+def read_week_output_meta(week_dir: str) -> dict:
+    try:
+        with open(os.path.join(week_dir, WEEK_OUTPUT_META_FILENAME)) as f:
+            return json.load(f)
+    except (OSError, ValueError):
+        return {}
+
+
+def count_bets(betgroup: BetGroup) -> int:
+    return len(betgroup.bets) + sum(
+        count_bets(sub_betgroup) for sub_betgroup in betgroup.sub_betgroups.values()
+    )
+
+
+def ingest_cfb_week(
+    week_bets_filepath: str, force: bool = False, bet_store: BetStore = None
+) -> WeekIngestResult:
+    start = time.perf_counter()
+    # A week that can't be fetched or written fails on its own instead of taking the whole run down
+    try:
+        week_dir = os.path.dirname(week_bets_filepath)
+        output_bets_filepath = os.path.join(week_dir, WEEK_OUTPUT_BETS_FILENAME)
+        output_json_filepath = os.path.join(week_dir, WEEK_OUTPUT_JSON_FILENAME)
+
+        with open(week_bets_filepath, "rb") as week_bets_file:
+            week_bets_bytes = week_bets_file.read()
+        input_sha256 = hashlib.sha256(week_bets_bytes).hexdigest()
+        meta = read_week_output_meta(week_dir)
+        is_input_unchanged = (
+            not force
+            and meta.get("input_sha256") == input_sha256
+            and os.path.exists(output_bets_filepath)
+            and os.path.exists(output_json_filepath)
+        )
+        # Same bets on games that are all over, nothing can come out different
+        if is_input_unchanged and meta.get("is_settled"):
+            # A store made after this week was last written doesn't have it yet
+            if bet_store is not None and not bet_store.has_betgroup(output_bets_filepath):
+                bet_store.save_betgroup(BetGroup.load_from_disk(output_bets_filepath), output_bets_filepath)
+            return WeekIngestResult(
+                week_bets_filepath=week_bets_filepath,
+                status="skipped",
+                seconds=time.perf_counter() - start,
+                num_bets=meta.get("num_bets", 0),
+            )
+
+        try:
+            week_bets, bet_str_errors = parse_cfb_week_bets_input(
+                week_bets_filepath, json.loads(week_bets_bytes)
+            )
+        except ValueError as e:
+            return WeekIngestResult(
+                week_bets_filepath=week_bets_filepath,
+                status="failed",
+                seconds=time.perf_counter() - start,
+                message=str(e),
+            )
+        num_bets = count_bets(week_bets)
+        if len(bet_str_errors) > 0:
+            # Leave the last good output alone rather than writing a week with bets missing
+            return WeekIngestResult(
+                week_bets_filepath=week_bets_filepath,
+                status="failed",
+                seconds=time.perf_counter() - start,
+                num_bets=num_bets,
+                bet_str_errors=bet_str_errors,
+            )
+
+        # Pending games that haven't moved since the last run leave the outputs as they are
+        fingerprint = week_bets.fingerprint()
+        if is_input_unchanged and meta.get("output_fingerprint") == fingerprint:
+            if bet_store is not None and not bet_store.has_betgroup(output_bets_filepath):
+                bet_store.save_betgroup(week_bets, output_bets_filepath)
+            return WeekIngestResult(
+                week_bets_filepath=week_bets_filepath,
+                status="unchanged",
+                seconds=time.perf_counter() - start,
+                num_bets=num_bets,
+            )
+
+        week_bets.save_to_disk(output_bets_filepath, fingerprint)
+        week_bets.save_json_to_disk(output_json_filepath)
+        # ui.py only reads the store once there is one, keyed by the .bets path like import_from_pickles
+        if bet_store is not None:
+            bet_store.save_betgroup(week_bets, output_bets_filepath)
+        with atomic_open(os.path.join(week_dir, WEEK_OUTPUT_META_FILENAME)) as f:
+            json.dump(
+                {
+                    "input_sha256": input_sha256,
+                    "output_fingerprint": fingerprint,
+                    "is_settled": week_bets.is_settled,
+                    "num_bets": num_bets,
+                },
+                f,
+                indent=4,
+            )
+        return WeekIngestResult(
+            week_bets_filepath=week_bets_filepath,
+            status="written",
+            seconds=time.perf_counter() - start,
+            num_bets=num_bets,
+        )
+    except (requests.RequestException, OSError, sqlite3.Error) as e:
+        return WeekIngestResult(
+            week_bets_filepath=week_bets_filepath,
+            status="failed",
+            seconds=time.perf_counter() - start,
+            message=f"{type(e).__name__}: {e}",
+        )
+
+
+def ingest_cfb_weeks(
+    week_bets_filepaths: list[str],
+    max_workers: int = DEFAULT_MAX_FETCH_WORKERS,
+    force: bool = False,
+    bet_store: BetStore = None,
+) -> list[WeekIngestResult]:
+    # Threads rather than processes, so every week shares the scoreboard cache and game registry.
+    # The time goes to ESPN round trips, which overlap fine under the GIL.
+    with ThreadPoolExecutor(max_workers=max_workers) as executor:
+        return list(
+            executor.map(
+                lambda week_bets_filepath: ingest_cfb_week(week_bets_filepath, force=force, bet_store=bet_store),
+                week_bets_filepaths,
+            )
+        )
+
+
+def format_week_ingest_summary(week_ingest_results: list[WeekIngestResult], wall_seconds: float) -> str:
+    lines = [f"{'week':<40} {'status':<10} {'bets':>6} {'seconds':>8}"]
+    for result in week_ingest_results:
+        week_name = os.path.relpath(os.path.dirname(result.week_bets_filepath))
+        lines.append(f"{week_name:<40} {result.status:<10} {result.num_bets:>6} {result.seconds:>8.2f}")
+    lines.append(
+        f"{len(week_ingest_results)} week(s) in {wall_seconds:.2f}s "
+        f"({sum(result.seconds for result in week_ingest_results):.2f}s summed across weeks)"
+    )
+    for result in week_ingest_results:
+        if result.message is not None:
+            lines.append(f"{result.week_bets_filepath}: {result.message}")
+        if len(result.bet_str_errors) > 0:
+            lines.append(f"{result.week_bets_filepath}: {format_bet_str_errors(result.bet_str_errors)}")
+    return "\n".join(lines)
+
+
 if __name__ == "__main__":
-    import time
-    
-
-    week_bets =  read_cfb_week_bets_input("/home/caleb/cfb-bets-tracker/bets/Week 5/input.json")
-    week_bets.save_to_disk("/home/caleb/cfb-bets-tracker/bets/Week 5/output.bets")
-    with open("/home/caleb/cfb-bets-tracker/bets/Week 5/output.json", "w") as f:
-        f.write(week_bets.to_json())
-    week_bets = read_cfb_week_bets_input("/home/caleb/cfb-bets-tracker/bets/Week 4/input.json")
-    week_bets.save_to_disk("/home/caleb/cfb-bets-tracker/bets/Week 4/output.bets")
-    with open("/home/caleb/cfb-bets-tracker/bets/Week 4/output.json", "w") as f:
-        f.write(week_bets.to_json())
\ No newline at end of file
+    parser = argparse.ArgumentParser(description="Ingest every week's input.json under a bets folder.")
+    parser.add_argument("bets_root", nargs="?", default=DEFAULT_BETS_ROOT)
+    parser.add_argument(
+        "--workers", type=int, default=DEFAULT_MAX_FETCH_WORKERS, help="weeks ingested at once"
+    )
+    parser.add_argument("--force", action="store_true", help="rebuild weeks even if nothing changed")
+    args = parser.parse_args()
+
+    week_bets_filepaths = find_cfb_week_bets_inputs(args.bets_root)
+    if len(week_bets_filepaths) == 0:
+        raise SystemExit(f"No {WEEK_INPUT_FILENAME} found under {args.bets_root}")
+
+    # Weeks go into the SQLite store too once there is one
+    bets_db_filepath = os.path.join(args.bets_root, BETS_DB_FILENAME)
+    bet_store = BetStore(bets_db_filepath) if os.path.exists(bets_db_filepath) else None
+    start = time.perf_counter()
+    week_ingest_results = ingest_cfb_weeks(
+        week_bets_filepaths, max_workers=args.workers, force=args.force, bet_store=bet_store
+    )
+    print(format_week_ingest_summary(week_ingest_results, time.perf_counter() - start))
+    if any(result.status == "failed" for result in week_ingest_results):
+        raise SystemExit(1)
@@ -0,0 +1,220 @@
+from collections import deque
+from dataclasses import dataclass, field
+from datetime import datetime, timezone
+from types import MappingProxyType
+from typing import Callable, Mapping
+from betgroup import BetGroup
+from bet import BetResults
+from game import Game
+from lazyweeks import LazyBetGroups, get_betgroup_header
+from metrics import metrics
+import copy
+import threading
+import time
+import traceback
+
+LIVE_POLL_SECONDS = 60
+IDLE_POLL_SECONDS = 6 * 60 * 60
+# Games still not over this long after kickoff (postponed, canceled) stop counting as live
+MAX_LIVE_SECONDS = 12 * 60 * 60
+# Refreshes never start closer together than this, however many people hit Refresh
+MIN_REFRESH_SECONDS = 15
+# How many snapshots behind a page can be and still only be sent what changed
+RENDER_VERSIONS_HISTORY = 32
+
+
+@dataclass(frozen=True)
+class Snapshot:
+    version: int
+    created_at: float
+    betgroups: Mapping[str, BetGroup] = field(default_factory=dict)
+    # ("section", path) and ("game", key) -> version, for whatever was loaded when it was published
+    render_versions: Mapping[tuple, int] = field(default_factory=dict)
+
+
+def add_render_versions(betgroup: BetGroup, section_path: tuple[str, ...], render_versions: dict[tuple, int]):
+    render_versions[("section", section_path)] = betgroup._version
+    for bet in betgroup.bets:
+        render_versions[("game", bet.game.get_key())] = bet.game._version
+    for sub_name, sub_betgroup in betgroup.sub_betgroups.items():
+        add_render_versions(sub_betgroup, section_path + (sub_name,), render_versions)
+
+
+def get_render_versions(betgroups: Mapping[str, BetGroup]) -> dict[tuple, int]:
+    render_versions = {}
+    for key in betgroups:
+        # Weeks nobody loaded yet have nothing on screen to update
+        if isinstance(betgroups, LazyBetGroups) and not betgroups.is_loaded(key):
+            continue
+        add_render_versions(betgroups[key], (key,), render_versions)
+    return render_versions
+
+
+def get_pending_games(betgroup: BetGroup, pending_games: dict[str, Game] = None) -> dict[str, Game]:
+    if pending_games is None:
+        pending_games = {}
+    if betgroup.is_settled:
+        return pending_games
+    for bet in betgroup.bets:
+        if bet.result == BetResults.PENDING.value:
+            pending_games[bet.game.get_key()] = bet.game
+    for sub_betgroup in betgroup.sub_betgroups.values():
+        get_pending_games(sub_betgroup, pending_games)
+    return pending_games
+
+
+def get_seconds_until_next_refresh(
+    betgroups: dict[str, BetGroup],
+    now: datetime = None,
+    live_poll_seconds: float = LIVE_POLL_SECONDS,
+    idle_poll_seconds: float = IDLE_POLL_SECONDS,
+) -> float:
+    if now is None:
+        now = datetime.now(timezone.utc)
+    pending_games = {}
+    for key in betgroups:
+        # Settled weeks that were never loaded stay that way
+        if not get_betgroup_header(betgroups, key).is_settled:
+            get_pending_games(betgroups[key], pending_games)
+
+    seconds_until_next_refresh = idle_poll_seconds
+    for game in pending_games.values():
+        seconds_until_kickoff = (game.get_start_datetime() - now).total_seconds()
+        if seconds_until_kickoff <= 0:
+            if seconds_until_kickoff > -MAX_LIVE_SECONDS:
+                # Kicked off and not over yet, so it's live
+                return live_poll_seconds
+            continue
+        seconds_until_next_refresh = min(seconds_until_next_refresh, seconds_until_kickoff)
+    return seconds_until_next_refresh
+
+
+class BackgroundRefresher:
+    def __init__(
+        self,
+        betgroups: dict[str, BetGroup],
+        refresh: Callable[[dict[str, BetGroup]], None],
+        live_poll_seconds: float = LIVE_POLL_SECONDS,
+        idle_poll_seconds: float = IDLE_POLL_SECONDS,
+        min_refresh_seconds: float = MIN_REFRESH_SECONDS,
+    ):
+        # Only the worker thread touches these betgroups, everyone else reads snapshots
+        self.betgroups = betgroups
+        self.refresh = refresh
+        self.live_poll_seconds = live_poll_seconds
+        self.idle_poll_seconds = idle_poll_seconds
+        self.min_refresh_seconds = min_refresh_seconds
+        self.wake_event = threading.Event()
+        self.thread = None
+        # Guards the refresh bookkeeping below, waiters on it are woken after every refresh
+        self.refresh_condition = threading.Condition()
+        self.is_refreshing = False
+        self.last_refresh_started_at = None
+        self.num_refreshes_done = 0
+        self.render_versions_history = deque(maxlen=RENDER_VERSIONS_HISTORY)
+        # Called with every new snapshot, on the refresher's thread
+        self.publish_listeners: list[Callable[[Snapshot], None]] = []
+        self.snapshot = Snapshot(version=0, created_at=time.time())
+        self.publish()
+
+    def publish(self):
+        if isinstance(self.betgroups, LazyBetGroups):
+            # Only the weeks loaded so far get copied, the rest load straight into the snapshot
+            previous_betgroups = self.snapshot.betgroups
+            betgroups = self.betgroups.copy_for_snapshot(
+                previous=previous_betgroups if isinstance(previous_betgroups, LazyBetGroups) else None
+            )
+        else:
+            # One deepcopy for the whole dict so games shared between weeks stay shared
+            betgroups = MappingProxyType(copy.deepcopy(self.betgroups))
+        snapshot = Snapshot(
+            version=self.snapshot.version + 1,
+            created_at=time.time(),
+            betgroups=betgroups,
+            render_versions=MappingProxyType(get_render_versions(betgroups)),
+        )
+        self.render_versions_history.append((snapshot.version, snapshot.render_versions))
+        self.snapshot = snapshot
+        for listener in self.publish_listeners:
+            listener(snapshot)
+
+    def get_changed_render_keys(self, since_version: int, snapshot: Snapshot) -> set[tuple]:
+        # None means the page is too far behind to tell, and should be sent everything
+        for version, render_versions in list(self.render_versions_history):
+            if version == since_version:
+                return {
+                    key
+                    for key, render_version in snapshot.render_versions.items()
+                    if render_versions.get(key) != render_version
+                }
+        return None
+
+    def refresh_and_publish(self):
+        self.refresh(self.betgroups)
+        self.publish()
+
+    def get_seconds_since_last_refresh_started(self) -> float:
+        if self.last_refresh_started_at is None:
+            return float("inf")
+        return time.monotonic() - self.last_refresh_started_at
+
+    def request_refresh(self, wait_seconds: float = 0) -> Snapshot:
+        # Single flight: a request during a refresh joins it, and one right after a refresh
+        # just gets that refresh's snapshot. Either way at most one refresh ever runs.
+        # Nothing would ever wake up to do it
+        if self.thread is None:
+            return self.snapshot
+        with self.refresh_condition:
+            if self.is_refreshing:
+                metrics.increment("refresh_requests_joined")
+            elif self.get_seconds_since_last_refresh_started() < self.min_refresh_seconds:
+                metrics.increment("refresh_requests_too_soon")
+                # Still wanted once the interval is up, run() sleeps out the rest of it
+                self.wake_event.set()
+                return self.snapshot
+            else:
+                self.wake_event.set()
+            num_refreshes_wanted = self.num_refreshes_done + 1
+            if wait_seconds > 0:
+                self.refresh_condition.wait_for(
+                    lambda: self.num_refreshes_done >= num_refreshes_wanted, timeout=wait_seconds
+                )
+            return self.snapshot
+
+    def run_refresh(self):
+        with self.refresh_condition:
+            self.is_refreshing = True
+            self.last_refresh_started_at = time.monotonic()
+        try:
+            self.refresh_and_publish()
+        finally:
+            with self.refresh_condition:
+                self.is_refreshing = False
+                self.num_refreshes_done += 1
+                self.refresh_condition.notify_all()
+
+    def run(self):
+        seconds_until_next_refresh = 0
+        while True:
+            self.wake_event.wait(seconds_until_next_refresh)
+            self.wake_event.clear()
+            # Requests that came in too soon after the last refresh wait out the rest of the interval
+            seconds_too_soon = self.min_refresh_seconds - self.get_seconds_since_last_refresh_started()
+            if seconds_too_soon > 0:
+                time.sleep(seconds_too_soon)
+                self.wake_event.clear()
+            try:
+                self.run_refresh()
+                seconds_until_next_refresh = get_seconds_until_next_refresh(
+                    self.betgroups,
+                    live_poll_seconds=self.live_poll_seconds,
+                    idle_poll_seconds=self.idle_poll_seconds,
+                )
+            except Exception:
+                traceback.print_exc()
+                seconds_until_next_refresh = self.live_poll_seconds
+
+    def start(self):
+        if self.thread is None:
+            self.thread = threading.Thread(target=self.run, name="background-refresher", daemon=True)
+            self.thread.start()
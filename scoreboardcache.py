@@ -0,0 +1,150 @@
+from concurrent.futures import ThreadPoolExecutor
+from dataclasses import dataclass
+from datetime import datetime, timedelta
+from typing import Callable
+from atomicfile import atomic_open
+from metrics import metrics
+import json
+import os
+import threading
+import time
+
+DEFAULT_SCOREBOARD_CACHE_DIR = os.path.join(
+    os.path.dirname(os.path.abspath(__file__)), ".scoreboard_cache"
+)
+DEFAULT_SCOREBOARD_CACHE_TTL_SECONDS = 60
+DEFAULT_MAX_FETCH_WORKERS = 8
+
+
+def get_dates_in_range(start_date: str, end_date: str = None) -> list[str]:
+    start_datetime = datetime.strptime(start_date, "%Y%m%d")
+    end_datetime = start_datetime if end_date is None else datetime.strptime(end_date, "%Y%m%d")
+    dates = []
+    while start_datetime <= end_datetime:
+        dates.append(start_datetime.strftime("%Y%m%d"))
+        start_datetime += timedelta(days=1)
+    return dates
+
+
+def is_event_over(event: dict) -> bool:
+    for competitor in event["competitions"][0]["competitors"]:
+        if "winner" in competitor:
+            return True
+    return False
+
+
+def is_day_final(date: str, games_data: dict) -> bool:
+    events = games_data.get("events", [])
+    if len(events) == 0:
+        # Games can still get added to an empty day that hasn't happened yet
+        yesterday = (datetime.now() - timedelta(days=1)).strftime("%Y%m%d")
+        return date < yesterday
+    return all(is_event_over(event) for event in events)
+
+
+@dataclass
+class CachedScoreboardDay:
+    date: str
+    games_data: dict
+    fetched_at: float
+    is_final: bool
+
+
+class ScoreboardCache:
+    def __init__(
+        self,
+        fetch_day: Callable[[str], dict],
+        cache_dir: str = DEFAULT_SCOREBOARD_CACHE_DIR,
+        ttl_seconds: float = DEFAULT_SCOREBOARD_CACHE_TTL_SECONDS,
+    ):
+        self.fetch_day = fetch_day
+        self.cache_dir = cache_dir
+        self.ttl_seconds = ttl_seconds
+        self.days: dict[str, CachedScoreboardDay] = {}
+        self.lock = threading.Lock()
+
+    def get_day_filepath(self, date: str) -> str:
+        return os.path.join(self.cache_dir, f"{date}.json")
+
+    def is_fresh(self, cached_day: CachedScoreboardDay) -> bool:
+        if cached_day.is_final:
+            return True
+        return time.time() - cached_day.fetched_at < self.ttl_seconds
+
+    def get_cached_day(self, date: str) -> CachedScoreboardDay:
+        with self.lock:
+            cached_day = self.days.get(date)
+        if cached_day is not None:
+            return cached_day
+
+        day_filepath = self.get_day_filepath(date)
+        if not os.path.exists(day_filepath):
+            return None
+        try:
+            with open(day_filepath) as f:
+                cached_day = CachedScoreboardDay(**json.load(f))
+        except (OSError, ValueError, TypeError):
+            return None
+        with self.lock:
+            self.days.setdefault(date, cached_day)
+        return cached_day
+
+    def put_day(self, date: str, games_data: dict) -> CachedScoreboardDay:
+        cached_day = CachedScoreboardDay(
+            date=date,
+            games_data=games_data,
+            fetched_at=time.time(),
+            is_final=is_day_final(date, games_data),
+        )
+        with self.lock:
+            self.days[date] = cached_day
+
+        if self.cache_dir is not None:
+            os.makedirs(self.cache_dir, exist_ok=True)
+            with atomic_open(self.get_day_filepath(date)) as f:
+                json.dump(cached_day.__dict__, f)
+        return cached_day
+
+    def get_stale_dates(self, dates: list[str]) -> list[str]:
+        stale_dates = []
+        for date in dates:
+            cached_day = self.get_cached_day(date)
+            if cached_day is None or not self.is_fresh(cached_day):
+                stale_dates.append(date)
+        return stale_dates
+
+    def fetch_and_put_day(self, date: str) -> CachedScoreboardDay:
+        return self.put_day(date, self.fetch_day(date))
+
+    def prefetch_dates(self, dates: list[str], max_workers: int = DEFAULT_MAX_FETCH_WORKERS):
+        stale_dates = self.get_stale_dates(dates)
+        metrics.increment("scoreboard_cache_prefetches", len(stale_dates))
+        if len(stale_dates) <= 1:
+            for date in stale_dates:
+                self.fetch_and_put_day(date)
+            return
+        with ThreadPoolExecutor(max_workers=min(max_workers, len(stale_dates))) as executor:
+            # list() so any fetch error gets raised here
+            list(executor.map(self.fetch_and_put_day, stale_dates))
+
+    def get_day(self, date: str) -> dict:
+        cached_day = self.get_cached_day(date)
+        if cached_day is None or not self.is_fresh(cached_day):
+            metrics.increment("scoreboard_cache_misses")
+            cached_day = self.fetch_and_put_day(date)
+        else:
+            metrics.increment("scoreboard_cache_hits")
+        return cached_day.games_data
+
+    def get_dates(self, start_date: str, end_date: str = None) -> dict:
+        events = []
+        seen_event_ids = set()
+        for date in get_dates_in_range(start_date, end_date):
+            for event in self.get_day(date).get("events", []):
+                event_id = event.get("id")
+                if event_id is not None:
+                    if event_id in seen_event_ids:
+                        continue
+                    seen_event_ids.add(event_id)
+                events.append(event)
+        return {"events": events}
@@ -0,0 +1,125 @@
+from dataclasses import dataclass
+from bet import Bet, BetResults, BetTypes
+import numpy as np
+
+BET_TYPE_CODES = {
+    BetTypes.MONEYLINE.value: 0,
+    BetTypes.SPREAD.value: 1,
+    BetTypes.OVER.value: 2,
+    BetTypes.UNDER.value: 3,
+    BetTypes.TEAM_OVER.value: 4,
+    BetTypes.TEAM_UNDER.value: 5,
+}
+
+RESULT_PENDING = 0
+RESULT_PUSH = 1
+RESULT_HIT = 2
+RESULT_MISS = 3
+
+RESULT_CODES = {
+    BetResults.PENDING.value: RESULT_PENDING,
+    BetResults.PUSH.value: RESULT_PUSH,
+    BetResults.HIT.value: RESULT_HIT,
+    BetResults.MISS.value: RESULT_MISS,
+}
+RESULTS_BY_CODE = {result_code: result for result, result_code in RESULT_CODES.items()}
+
+
+@dataclass
+class SettlementColumns:
+    # line is the spread for spread bets, the points for totals, unused for moneylines.
+    # team_score/opponent_score are the taking team and its opponent for team bets,
+    # and the game's first and second team for game totals.
+    bet_type_code: np.ndarray
+    line: np.ndarray
+    odds: np.ndarray
+    team_score: np.ndarray
+    opponent_score: np.ndarray
+    is_over: np.ndarray
+
+    def __len__(self):
+        return len(self.bet_type_code)
+
+
+def bets_to_columns(bets: list[Bet]) -> SettlementColumns:
+    bet_type_code = np.empty(len(bets), dtype=np.int8)
+    line = np.zeros(len(bets), dtype=np.float64)
+    odds = np.empty(len(bets), dtype=np.int64)
+    team_score = np.empty(len(bets), dtype=np.int64)
+    opponent_score = np.empty(len(bets), dtype=np.int64)
+    is_over = np.empty(len(bets), dtype=bool)
+
+    for i, bet in enumerate(bets):
+        bet_type_code[i] = BET_TYPE_CODES[bet.bet_type]
+        odds[i] = bet.odds
+        is_over[i] = bet.game.is_over
+        if hasattr(bet, "taking_team"):
+            team_score[i] = bet.game.get_team(bet.taking_team.full_name).score
+            opponent_score[i] = bet.game.get_opposing_team(bet.taking_team.full_name).score
+        else:
+            team_score[i] = bet.game.teams[0].score
+            opponent_score[i] = bet.game.teams[1].score
+        if bet.bet_type == BetTypes.SPREAD.value:
+            line[i] = bet.taking_spread
+        elif bet.bet_type != BetTypes.MONEYLINE.value:
+            line[i] = bet.taking_points
+
+    return SettlementColumns(
+        bet_type_code=bet_type_code,
+        line=line,
+        odds=odds,
+        team_score=team_score,
+        opponent_score=opponent_score,
+        is_over=is_over,
+    )
+
+
+def settle(columns: SettlementColumns) -> tuple[np.ndarray, np.ndarray]:
+    # Bet.update_profits divides by zero on these too, there's no such price in American odds
+    if np.any(columns.odds == 0):
+        raise ValueError("Odds of 0 are not valid American odds")
+    bet_type_code = columns.bet_type_code
+    team_score = columns.team_score.astype(np.float64)
+    opponent_score = columns.opponent_score.astype(np.float64)
+
+    # Every bet type boils down to comparing a "for" number against an "against" number.
+    # A positive margin hits, zero pushes and negative misses.
+    margin = np.select(
+        [
+            bet_type_code == BET_TYPE_CODES[BetTypes.MONEYLINE.value],
+            bet_type_code == BET_TYPE_CODES[BetTypes.SPREAD.value],
+            bet_type_code == BET_TYPE_CODES[BetTypes.OVER.value],
+            bet_type_code == BET_TYPE_CODES[BetTypes.UNDER.value],
+            bet_type_code == BET_TYPE_CODES[BetTypes.TEAM_OVER.value],
+            bet_type_code == BET_TYPE_CODES[BetTypes.TEAM_UNDER.value],
+        ],
+        [
+            team_score - opponent_score,
+            team_score + columns.line - opponent_score,
+            team_score + opponent_score - columns.line,
+            columns.line - (team_score + opponent_score),
+            team_score - columns.line,
+            columns.line - team_score,
+        ],
+    )
+    result_codes = np.where(
+        margin > 0, RESULT_HIT, np.where(margin < 0, RESULT_MISS, RESULT_PUSH)
+    ).astype(np.int8)
+    # Moneylines can't push, a tie is a miss
+    is_moneyline = bet_type_code == BET_TYPE_CODES[BetTypes.MONEYLINE.value]
+    result_codes[is_moneyline & (result_codes == RESULT_PUSH)] = RESULT_MISS
+    result_codes[~columns.is_over] = RESULT_PENDING
+
+    odds = columns.odds.astype(np.float64)
+    hit_profit = np.where(odds > 0, odds / 100, 100 / np.abs(odds))
+    unit_profit = np.select(
+        [result_codes == RESULT_HIT, result_codes == RESULT_MISS],
+        [hit_profit, -1.0],
+        default=0.0,
+    )
+    return result_codes, unit_profit
+
+
+def settle_bets(bets: list[Bet]) -> tuple[list[str], np.ndarray]:
+    result_codes, unit_profit = settle(bets_to_columns(bets))
+    return [RESULTS_BY_CODE[result_code] for result_code in result_codes.tolist()], unit_profit
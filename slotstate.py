@@ -0,0 +1,50 @@
+import copy
+from dataclasses import MISSING, fields
+
+# One names tuple per class, always the same object, so pickle writes it once per file
+pickled_field_names_by_class: dict[type, tuple[str, ...]] = {}
+
+
+def get_pickled_field_names(cls: type) -> tuple[str, ...]:
+    # Fields with metadata={"pickle": False} only mean something in this process,
+    # they get their default back when unpickled
+    field_names = pickled_field_names_by_class.get(cls)
+    if field_names is None:
+        field_names = pickled_field_names_by_class.setdefault(
+            cls, tuple(field.name for field in fields(cls) if field.metadata.get("pickle", True))
+        )
+    return field_names
+
+
+class SlotsPickleMixin:
+    __slots__ = ()
+
+    def __getstate__(self):
+        # Field names plus values, the names keep old pickles loadable as fields get added
+        field_names = get_pickled_field_names(type(self))
+        return field_names, tuple(getattr(self, field_name) for field_name in field_names)
+
+    def __deepcopy__(self, memo: dict):
+        # Unlike pickling, a deepcopy keeps every field, snapshots need the versions
+        copied = object.__new__(type(self))
+        memo[id(self)] = copied
+        for field in fields(self):
+            object.__setattr__(copied, field.name, copy.deepcopy(getattr(self, field.name), memo))
+        return copied
+
+    def __setstate__(self, state):
+        if isinstance(state, tuple):
+            field_names, values = state
+            state = dict(zip(field_names, values))
+        # Pickles from before the models were slotted hold a plain __dict__.
+        # Any kind can be missing fields that were added since.
+        for field in fields(self):
+            if field.name in state:
+                value = state[field.name]
+            elif field.default is not MISSING:
+                value = field.default
+            elif field.default_factory is not MISSING:
+                value = field.default_factory()
+            else:
+                raise ValueError(f"Pickled {type(self).__name__} is missing {field.name}")
+            object.__setattr__(self, field.name, value)
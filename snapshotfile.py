@@ -0,0 +1,364 @@
+import hashlib
+import json
+import mmap
+import os
+import pickle
+import struct
+import threading
+import time
+from collections import deque
+from dataclasses import asdict
+from typing import Callable, Mapping
+from atomicfile import atomic_open
+from betgroup import BetGroup
+from game import GameRegistry
+from lazyweeks import BetGroupSummary, LazyBetGroups
+from leaderboard import Leaderboards
+from metrics import metrics
+from refresher import RENDER_VERSIONS_HISTORY, Snapshot, add_render_versions
+
+# A snapshot file is the magic and the header's length, a JSON header, then the pickled weeks
+# and leaderboards the header points into. One refresher process writes them, any number of
+# serving processes mmap them read-only.
+SNAPSHOT_MAGIC = b"CFBSNAP1"
+SNAPSHOT_PREFIX = struct.Struct("<8sQ")
+CURRENT_FILENAME = "CURRENT"
+# Which render keys changed with each recent version, so readers don't need the old snapshots
+HISTORY_FILENAME = "HISTORY"
+REFRESH_REQUESTED_FILENAME = "REFRESH_REQUESTED"
+# How often readers look for a new version, and the refresher for refresh requests
+SNAPSHOT_CHECK_SECONDS = 1.0
+REFRESH_REQUEST_POLL_SECONDS = 1.0
+
+
+def get_snapshot_filename(version: int) -> str:
+    return f"snapshot-{version:012d}.bin"
+
+
+def encode_render_keys(render_keys: set[tuple]) -> list:
+    # ("section", (week, show, ...)) and ("game", key), JSON has no tuples
+    return [[kind, list(value) if isinstance(value, tuple) else value] for kind, value in render_keys]
+
+
+def decode_render_keys(encoded_render_keys: list) -> set[tuple]:
+    return {(kind, tuple(value) if isinstance(value, list) else value) for kind, value in encoded_render_keys}
+
+
+def read_history(snapshots_folder: str) -> dict[int, tuple[int, list]]:
+    # version -> (previous version, encoded render keys that changed since it)
+    try:
+        with open(os.path.join(snapshots_folder, HISTORY_FILENAME)) as f:
+            return {version: (previous_version, keys) for version, previous_version, keys in json.load(f)}
+    except (OSError, ValueError):
+        return {}
+
+
+def read_snapshot_header(snapshot_filepath: str) -> dict:
+    with open(snapshot_filepath, "rb") as f:
+        magic, header_length = SNAPSHOT_PREFIX.unpack(f.read(SNAPSHOT_PREFIX.size))
+        if magic != SNAPSHOT_MAGIC:
+            raise ValueError(f"{snapshot_filepath} is not a snapshot file")
+        return json.loads(f.read(header_length))
+
+
+def read_current_snapshot_filename(snapshots_folder: str) -> str:
+    try:
+        with open(os.path.join(snapshots_folder, CURRENT_FILENAME)) as f:
+            return f.read().strip() or None
+    except OSError:
+        return None
+
+
+class SnapshotWriter:
+    def __init__(self, snapshots_folder: str, leaderboards: Leaderboards = None, keep: int = 2):
+        os.makedirs(snapshots_folder, exist_ok=True)
+        self.snapshots_folder = snapshots_folder
+        self.leaderboards = leaderboards
+        # What changed between versions is in HISTORY, older files are only kept for a reader
+        # that's in the middle of mapping one
+        self.keep = keep
+        # Render versions from another run of the refresher can't be compared with this one's
+        self.writer_id = f"{os.getpid()}-{time.time_ns()}"
+        # Versions carry on from the last run, so a page's version never means two different snapshots
+        self.base_version = 0
+        current_filename = read_current_snapshot_filename(snapshots_folder)
+        if current_filename is not None:
+            try:
+                self.base_version = read_snapshot_header(os.path.join(snapshots_folder, current_filename))["version"]
+            except (OSError, ValueError, KeyError):
+                pass
+        # key -> (render versions, blob, sha256), a week is only pickled again when something in it changed
+        self.blobs_by_week: dict[str, tuple[dict, bytes, str]] = {}
+        # (leaderboards version, blob)
+        self.leaderboards_blob: tuple[int, bytes] = None
+        # What went into the last file written, a snapshot with the same is skipped
+        self.written_weeks: dict[str, dict] = None
+        self.written_leaderboards_version: int = None
+        self.written_render_versions: dict[tuple, int] = {}
+        self.written_version: int = None
+        # [version, previous version, changed render keys], oldest first
+        self.history = deque(maxlen=RENDER_VERSIONS_HISTORY)
+
+    def get_week_blob(self, key: str, betgroup: BetGroup) -> tuple[bytes, str]:
+        week_render_versions = {}
+        add_render_versions(betgroup, (key,), week_render_versions)
+        cached = self.blobs_by_week.get(key)
+        if cached is None or cached[0] != week_render_versions:
+            blob = pickle.dumps(betgroup)
+            cached = (week_render_versions, blob, hashlib.sha256(blob).hexdigest())
+            self.blobs_by_week[key] = cached
+        return cached[1], cached[2]
+
+    def get_leaderboards_blob(self, leaderboards_version: int) -> bytes:
+        if self.leaderboards_blob is None or self.leaderboards_blob[0] != leaderboards_version:
+            self.leaderboards_blob = (leaderboards_version, pickle.dumps(self.leaderboards.get_rollups()))
+        return self.leaderboards_blob[1]
+
+    def write(self, snapshot: Snapshot):
+        with metrics.timed("snapshot_write"):
+            betgroups = snapshot.betgroups
+            if isinstance(betgroups, LazyBetGroups):
+                summaries = betgroups.get_summaries()
+                loaded_keys = {key for key in betgroups if betgroups.is_loaded(key)}
+            else:
+                summaries = {key: BetGroupSummary.from_betgroup(betgroup) for key, betgroup in betgroups.items()}
+                loaded_keys = set(betgroups)
+
+            blobs = []
+            blobs_length = 0
+
+            def add_blob(blob: bytes) -> dict:
+                nonlocal blobs_length
+                blobs.append(blob)
+                blobs_length += len(blob)
+                return {"offset": blobs_length - len(blob), "length": len(blob)}
+
+            weeks = {}
+            for key in betgroups:
+                summary = summaries.get(key)
+                week = {"summary": asdict(summary) if summary is not None else None}
+                # Weeks the refresher never loaded are read from their source by whoever wants them
+                if key in loaded_keys:
+                    blob, sha256 = self.get_week_blob(key, betgroups[key])
+                    week.update(add_blob(blob), sha256=sha256)
+                weeks[key] = week
+            leaderboards_blob_info = None
+            leaderboards_version = None
+            # Half-built leaderboards aren't worth showing
+            if self.leaderboards is not None and self.leaderboards.get_num_weeks() >= len(betgroups):
+                # Read before the rollups, so the blob is never older than the version it's saved with
+                leaderboards_version = self.leaderboards.version
+                leaderboards_blob_info = add_blob(self.get_leaderboards_blob(leaderboards_version))
+            # Most refreshes change nothing, and readers have nothing to pick up from those
+            if weeks == self.written_weeks and leaderboards_version == self.written_leaderboards_version:
+                return
+
+            version = self.base_version + snapshot.version
+            header_bytes = json.dumps(
+                {
+                    "version": version,
+                    "created_at": snapshot.created_at,
+                    "writer_id": self.writer_id,
+                    "weeks": weeks,
+                    "leaderboards": leaderboards_blob_info,
+                    "leaderboards_version": leaderboards_version,
+                }
+            ).encode()
+            snapshot_filename = get_snapshot_filename(version)
+            with atomic_open(os.path.join(self.snapshots_folder, snapshot_filename), "wb") as f:
+                f.write(SNAPSHOT_PREFIX.pack(SNAPSHOT_MAGIC, len(header_bytes)))
+                f.write(header_bytes)
+                for blob in blobs:
+                    f.write(blob)
+            self.write_history(version, snapshot.render_versions)
+            with atomic_open(os.path.join(self.snapshots_folder, CURRENT_FILENAME)) as f:
+                f.write(snapshot_filename)
+            self.written_weeks = weeks
+            self.written_leaderboards_version = leaderboards_version
+            self.remove_old_snapshots()
+
+    def write_history(self, version: int, render_versions: Mapping[tuple, int]):
+        # Written before CURRENT points at the new version, so a reader that sees it can always diff it.
+        # The first version from this run has no previous one, render versions from the last run
+        # can't be compared with these.
+        changed_render_keys = {
+            key
+            for key, render_version in render_versions.items()
+            if self.written_render_versions.get(key) != render_version
+        }
+        self.history.append([version, self.written_version, encode_render_keys(changed_render_keys)])
+        with atomic_open(os.path.join(self.snapshots_folder, HISTORY_FILENAME)) as f:
+            json.dump(list(self.history), f)
+        self.written_render_versions = dict(render_versions)
+        self.written_version = version
+
+    def remove_old_snapshots(self):
+        snapshot_filenames = sorted(
+            filename
+            for filename in os.listdir(self.snapshots_folder)
+            if filename.startswith("snapshot-") and filename.endswith(".bin")
+        )
+        # Readers that still have one mapped keep reading it fine after it's unlinked
+        for filename in snapshot_filenames[: -self.keep]:
+            try:
+                os.remove(os.path.join(self.snapshots_folder, filename))
+            except OSError:
+                pass
+
+
+class MappedSnapshot:
+    def __init__(
+        self,
+        snapshots_folder: str,
+        snapshot_filename: str,
+        fallback_betgroups: LazyBetGroups,
+        previous: "MappedSnapshot" = None,
+    ):
+        self.snapshot_filename = snapshot_filename
+        with open(os.path.join(snapshots_folder, snapshot_filename), "rb") as f:
+            self.mapping = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+        magic, header_length = SNAPSHOT_PREFIX.unpack_from(self.mapping)
+        if magic != SNAPSHOT_MAGIC:
+            raise ValueError(f"{snapshot_filename} is not a snapshot file")
+        self.blobs_start = SNAPSHOT_PREFIX.size + header_length
+        self.header = json.loads(self.mapping[SNAPSHOT_PREFIX.size : self.blobs_start])
+        self.leaderboards = None
+        # Decoded leaderboards carry over too, until the refresher's version of them changes
+        if previous is not None and self.get_leaderboards_key() == previous.get_leaderboards_key():
+            self.leaderboards = previous.leaderboards
+
+        loaders = {}
+        summaries = {}
+        loaded = {}
+        for key, week in self.header["weeks"].items():
+            if "sha256" in week:
+                loaders[key] = lambda registry, week=week: BetGroup.load_from_bytes(self.get_blob(week), registry)
+                # Weeks that haven't changed since the last version are handed over as they are,
+                # so only the weeks that changed ever get unpickled again
+                if previous is not None and previous.snapshot.betgroups.is_loaded(key):
+                    if previous.header["weeks"].get(key, {}).get("sha256") == week["sha256"]:
+                        loaded[key] = previous.snapshot.betgroups.loaded[key]
+            elif key in fallback_betgroups.loaders:
+                loaders[key] = fallback_betgroups.loaders[key]
+                # Same goes for weeks read from their source, as long as the refresher didn't load them since
+                if previous is not None and previous.snapshot.betgroups.is_loaded(key):
+                    previous_week = previous.header["weeks"].get(key, {})
+                    if "sha256" not in previous_week and previous_week.get("summary") == week["summary"]:
+                        loaded[key] = previous.snapshot.betgroups.loaded[key]
+            else:
+                continue
+            if week["summary"] is not None:
+                summaries[key] = BetGroupSummary(**week["summary"])
+        self.snapshot = Snapshot(
+            version=self.header["version"],
+            created_at=self.header["created_at"],
+            betgroups=LazyBetGroups(loaders, summaries=summaries, loaded=loaded, registry=GameRegistry()),
+        )
+
+    def get_blob(self, blob_info: dict) -> bytes:
+        start = self.blobs_start + blob_info["offset"]
+        return self.mapping[start : start + blob_info["length"]]
+
+    def get_leaderboards_key(self) -> tuple:
+        if self.header["leaderboards"] is None:
+            return None
+        return self.header["writer_id"], self.header["leaderboards_version"]
+
+    def get_leaderboards(self) -> Leaderboards:
+        if self.leaderboards is None and self.header["leaderboards"] is not None:
+            self.leaderboards = Leaderboards.from_rollups(pickle.loads(self.get_blob(self.header["leaderboards"])))
+        return self.leaderboards
+
+
+class SnapshotReader:
+    # Stands in for BackgroundRefresher in processes that only serve pages: same snapshot,
+    # request_refresh and get_changed_render_keys. Moving to a new version is one attribute
+    # assignment and old mappings go away with the last reference to them, so nothing locks.
+    def __init__(self, snapshots_folder: str, fallback_betgroups: LazyBetGroups):
+        self.snapshots_folder = snapshots_folder
+        self.fallback_betgroups = fallback_betgroups
+        self.mapped_snapshot: MappedSnapshot = None
+        self.checked_at = 0.0
+        # Read from HISTORY along with each new version
+        self.history: dict[int, tuple[int, list]] = {}
+        # Until the refresher publishes anything, pages are served from the weeks on disk
+        self.unpublished_snapshot = Snapshot(version=0, created_at=time.time(), betgroups=fallback_betgroups)
+
+    def get_mapped_snapshot(self) -> MappedSnapshot:
+        now = time.monotonic()
+        if now - self.checked_at >= SNAPSHOT_CHECK_SECONDS:
+            self.checked_at = now
+            self.map_current_snapshot()
+        return self.mapped_snapshot
+
+    def map_current_snapshot(self):
+        snapshot_filename = read_current_snapshot_filename(self.snapshots_folder)
+        mapped_snapshot = self.mapped_snapshot
+        if snapshot_filename is None or (
+            mapped_snapshot is not None and mapped_snapshot.snapshot_filename == snapshot_filename
+        ):
+            return
+        with metrics.timed("snapshot_map"):
+            try:
+                mapped_snapshot = MappedSnapshot(
+                    self.snapshots_folder, snapshot_filename, self.fallback_betgroups, previous=mapped_snapshot
+                )
+            except (OSError, ValueError):
+                # Replaced and removed between reading CURRENT and opening it, the next check gets the newer one
+                return
+        self.history = read_history(self.snapshots_folder)
+        self.mapped_snapshot = mapped_snapshot
+
+    @property
+    def snapshot(self) -> Snapshot:
+        mapped_snapshot = self.get_mapped_snapshot()
+        return mapped_snapshot.snapshot if mapped_snapshot is not None else self.unpublished_snapshot
+
+    def get_leaderboards(self) -> Leaderboards:
+        mapped_snapshot = self.get_mapped_snapshot()
+        return mapped_snapshot.get_leaderboards() if mapped_snapshot is not None else None
+
+    def request_refresh(self, wait_seconds: float = 0) -> Snapshot:
+        # Picked up by watch_refresh_requests in the refresher process, which coalesces them.
+        # Nothing waits on it from here, the new version shows up with the next live update.
+        requested_filepath = os.path.join(self.snapshots_folder, REFRESH_REQUESTED_FILENAME)
+        with open(requested_filepath, "a"):
+            pass
+        os.utime(requested_filepath)
+        return self.snapshot
+
+    def get_changed_render_keys(self, since_version: int, snapshot: Snapshot) -> set[tuple]:
+        # None means the page is too far behind to tell, and should be sent everything
+        history = self.history
+        changed_render_keys = set()
+        version = snapshot.version
+        while version != since_version:
+            if version not in history:
+                return None
+            version, encoded_render_keys = history[version]
+            changed_render_keys |= decode_render_keys(encoded_render_keys)
+        return changed_render_keys
+
+
+def watch_refresh_requests(snapshots_folder: str, request_refresh: Callable[[], Snapshot]) -> threading.Thread:
+    # Serving processes can't reach the refresher's thread, so they touch a file it keeps an eye on
+    requested_filepath = os.path.join(snapshots_folder, REFRESH_REQUESTED_FILENAME)
+
+    def get_requested_mtime_ns() -> int:
+        try:
+            return os.stat(requested_filepath).st_mtime_ns
+        except OSError:
+            return None
+
+    def watch():
+        last_requested_mtime_ns = get_requested_mtime_ns()
+        while True:
+            time.sleep(REFRESH_REQUEST_POLL_SECONDS)
+            requested_mtime_ns = get_requested_mtime_ns()
+            if requested_mtime_ns != last_requested_mtime_ns:
+                last_requested_mtime_ns = requested_mtime_ns
+                request_refresh()
+
+    thread = threading.Thread(target=watch, name="refresh-request-watcher", daemon=True)
+    thread.start()
+    return thread
@@ -1,15 +1,102 @@
 from dataclasses import dataclass
+from slotstate import SlotsPickleMixin
 
 
-@dataclass
+@dataclass(frozen=True, slots=True)
 class Team:
     full_name: str
     short_name: str
     abbreviation: str
     logo_url: str
 
+    def __reduce__(self):
+        # Unpickled teams go back through the registry so they stay shared
+        return intern_team, (self.full_name, self.short_name, self.abbreviation, self.logo_url)
 
-@dataclass
-class TeamInGame(Team):
+    def __copy__(self):
+        return self
+
+    def __deepcopy__(self, memo):
+        return self
+
+
+class TeamRegistry:
+    def __init__(self):
+        self.teams: dict[tuple[str, str, str, str], Team] = {}
+
+    def intern(self, full_name: str, short_name: str, abbreviation: str, logo_url: str) -> Team:
+        team_key = (full_name, short_name, abbreviation, logo_url)
+        team = self.teams.get(team_key)
+        if team is None:
+            team = self.teams.setdefault(team_key, Team(*team_key))
+        return team
+
+
+# Static team metadata is stored once here and shared by every game
+team_registry = TeamRegistry()
+
+
+def intern_team(full_name: str, short_name: str, abbreviation: str, logo_url: str) -> Team:
+    return team_registry.intern(full_name, short_name, abbreviation, logo_url)
+
+
+@dataclass(slots=True)
+class TeamInGame(SlotsPickleMixin):
+    team: Team
     score: int
     is_home_team: bool
+
+    @classmethod
+    def from_team_info(
+        cls,
+        full_name: str,
+        short_name: str,
+        abbreviation: str,
+        logo_url: str,
+        score: int,
+        is_home_team: bool,
+    ):
+        return cls(
+            team=intern_team(full_name, short_name, abbreviation, logo_url),
+            score=score,
+            is_home_team=is_home_team,
+        )
+
+    @property
+    def full_name(self) -> str:
+        return self.team.full_name
+
+    @property
+    def short_name(self) -> str:
+        return self.team.short_name
+
+    @property
+    def abbreviation(self) -> str:
+        return self.team.abbreviation
+
+    @property
+    def logo_url(self) -> str:
+        return self.team.logo_url
+
+    def get_json_items(self) -> list[tuple[str, object]]:
+        # Same flat shape TeamInGame had before the team metadata got split out
+        return [
+            ("full_name", self.team.full_name),
+            ("short_name", self.team.short_name),
+            ("abbreviation", self.team.abbreviation),
+            ("logo_url", self.team.logo_url),
+            ("score", self.score),
+            ("is_home_team", self.is_home_team),
+        ]
+
+    def __setstate__(self, state):
+        if isinstance(state, dict) and "team" not in state:
+            # Pickled before TeamInGame held an interned Team
+            state = {
+                "team": intern_team(
+                    state["full_name"], state["short_name"], state["abbreviation"], state["logo_url"]
+                ),
+                "score": state["score"],
+                "is_home_team": state["is_home_team"],
+            }
+        SlotsPickleMixin.__setstate__(self, state)
@@ -0,0 +1,147 @@
+import functools
+import re
+
+# Bet strings are written however the show said it. These map the usual nicknames
+# (already normalized) to ESPN's displayName. An alias only counts if its team is on the slate,
+# and one that lists several teams is ambiguous if more than one of them is playing.
+TEAM_NAME_ALIASES = {
+    "bama": ["Alabama Crimson Tide"],
+    "app state": ["App State Mountaineers"],
+    "appalachian state": ["App State Mountaineers"],
+    "cal": ["California Golden Bears"],
+    "fsu": ["Florida State Seminoles"],
+    "ga tech": ["Georgia Tech Yellow Jackets"],
+    "miami fl": ["Miami Hurricanes"],
+    "miami florida": ["Miami Hurricanes"],
+    "the u": ["Miami Hurricanes"],
+    "miami ohio": ["Miami (OH) RedHawks"],
+    "miss state": ["Mississippi State Bulldogs"],
+    "mississippi": ["Ole Miss Rebels"],
+    "nc state": ["NC State Wolfpack"],
+    "north carolina state": ["NC State Wolfpack"],
+    "osu": ["Ohio State Buckeyes", "Oklahoma State Cowboys", "Oregon State Beavers"],
+    "pitt": ["Pittsburgh Panthers"],
+    "southern cal": ["USC Trojans"],
+    "umass": ["Massachusetts Minutemen"],
+    "unc": ["North Carolina Tar Heels"],
+    "uva": ["Virginia Cavaliers"],
+    "vt": ["Virginia Tech Hokies"],
+    "wazzu": ["Washington State Cougars"],
+    "wsu": ["Washington State Cougars"],
+    "ucf": ["UCF Knights"],
+    "usf": ["South Florida Bulls"],
+    "texas a and m": ["Texas A&M Aggies"],
+    "tamu": ["Texas A&M Aggies"],
+}
+
+NGRAM_SIZE = 3
+# How alike two names' trigrams need to be before the fallback calls it a match,
+# and how far ahead of the runner-up the best match has to be to not be ambiguous
+MIN_NGRAM_SIMILARITY = 0.5
+AMBIGUOUS_NGRAM_MARGIN = 0.1
+
+PUNCTUATION_REGEX = re.compile(r"[^\w\s]")
+
+
+class AmbiguousTeamNameError(ValueError):
+    def __init__(self, team_name: str, candidates: list[str]):
+        self.team_name = team_name
+        self.candidates = candidates
+        super().__init__(f"Team name {team_name!r} is ambiguous, could be any of: {', '.join(candidates)}")
+
+
+def normalize_team_name(team_name: str) -> str:
+    team_name = team_name.casefold().replace("&", " and ")
+    tokens = PUNCTUATION_REGEX.sub(" ", team_name).split()
+    # "Michigan St" and "Michigan St." are how bets spell "Michigan State"
+    if len(tokens) > 1 and tokens[-1] == "st":
+        tokens[-1] = "state"
+    return " ".join(tokens)
+
+
+def get_mascot(full_name: str, short_name: str) -> str:
+    # "Ohio State Buckeyes" with a short name of "Ohio State" leaves "Buckeyes"
+    if full_name.startswith(short_name + " "):
+        return full_name[len(short_name) + 1 :]
+    return None
+
+
+def get_ngrams(normalized_name: str, n: int = NGRAM_SIZE) -> set[str]:
+    padded_name = f" {normalized_name} "
+    return {padded_name[i : i + n] for i in range(max(len(padded_name) - n + 1, 1))}
+
+
+def get_ngram_similarity(ngrams: set[str], other_ngrams: set[str]) -> float:
+    if len(ngrams) == 0 or len(other_ngrams) == 0:
+        return 0.0
+    return len(ngrams & other_ngrams) / len(ngrams | other_ngrams)
+
+
+class TeamAliasIndex:
+    def __init__(self, teams_names: list[tuple[str, str, str]]):
+        # teams_names are (full_name, short_name, abbreviation), everything resolves to the full_name
+        self.full_names_by_name: dict[str, set[str]] = {}
+        for team_names in teams_names:
+            full_name = team_names[0]
+            for team_name in team_names + (get_mascot(full_name, team_names[1]),):
+                if team_name:
+                    self.full_names_by_name.setdefault(normalize_team_name(team_name), set()).add(full_name)
+        full_names = {team_names[0] for team_names in teams_names}
+        for alias, alias_full_names in TEAM_NAME_ALIASES.items():
+            # ESPN's own names win, "OSU" is Ohio State's abbreviation
+            if alias in self.full_names_by_name:
+                continue
+            playing_full_names = {full_name for full_name in alias_full_names if full_name in full_names}
+            if len(playing_full_names) > 0:
+                self.full_names_by_name[alias] = playing_full_names
+        self.ngrams_by_name = {name: get_ngrams(name) for name in self.full_names_by_name}
+        self.tokens_by_name = {name: name.split() for name in self.full_names_by_name}
+        # Each bet-string team name only gets resolved once per slate
+        self.resolutions: dict[str, str] = {}
+
+    def resolve(self, team_name: str) -> str:
+        if team_name not in self.resolutions:
+            self.resolutions[team_name] = self.resolve_uncached(team_name)
+        return self.resolutions[team_name]
+
+    def resolve_uncached(self, team_name: str) -> str:
+        normalized_name = normalize_team_name(team_name)
+        full_names = self.full_names_by_name.get(normalized_name)
+        if full_names is None:
+            full_names = self.find_similar_full_names(normalized_name)
+        if len(full_names) == 0:
+            return None
+        if len(full_names) > 1:
+            raise AmbiguousTeamNameError(team_name, sorted(full_names))
+        return next(iter(full_names))
+
+    def find_similar_full_names(self, normalized_name: str) -> set[str]:
+        ngrams = get_ngrams(normalized_name)
+        tokens = normalized_name.split()
+        best_similarity_by_full_name: dict[str, float] = {}
+        for name, name_ngrams in self.ngrams_by_name.items():
+            # Only the last word gets to be misspelled. Adding or dropping a word makes a different
+            # team, "Michigan" isn't "Michigan State" just because State is the one playing.
+            name_tokens = self.tokens_by_name[name]
+            if len(name_tokens) != len(tokens) or name_tokens[:-1] != tokens[:-1]:
+                continue
+            similarity = get_ngram_similarity(ngrams, name_ngrams)
+            if similarity < MIN_NGRAM_SIMILARITY:
+                continue
+            for full_name in self.full_names_by_name[name]:
+                if similarity > best_similarity_by_full_name.get(full_name, 0.0):
+                    best_similarity_by_full_name[full_name] = similarity
+        if len(best_similarity_by_full_name) == 0:
+            return set()
+        best_similarity = max(best_similarity_by_full_name.values())
+        return {
+            full_name
+            for full_name, similarity in best_similarity_by_full_name.items()
+            if similarity >= best_similarity - AMBIGUOUS_NGRAM_MARGIN
+        }
+
+
+@functools.lru_cache(maxsize=4096)
+def get_team_alias_index(teams_names: tuple[tuple[str, str, str], ...]) -> TeamAliasIndex:
+    # Games ask about the same couple of teams over and over, so their indexes are shared
+    return TeamAliasIndex(list(teams_names))
@@ -0,0 +1,70 @@
+import io
+import json
+from dataclasses import asdict
+import pytest
+from bet import MoneylineBet, OverBet, SpreadBet
+from betgroup import BetGroup
+from game import Game
+import jsonstream
+from team import TeamInGame
+
+
+def to_output_dict(items: list[tuple[str, object]]) -> dict:
+    output_dict = {key: value for key, value in items if not key.startswith("_")}
+    # output.json keeps a game's teams flat, the way they were before Team got interned
+    if "team" in output_dict and "is_home_team" in output_dict:
+        output_dict = {**output_dict.pop("team"), **output_dict}
+    return output_dict
+
+
+def make_week() -> BetGroup:
+    game = Game(
+        teams=[
+            TeamInGame.from_team_info("Hawai'i Rainbow Warriors", "Hawai'i", "HAW", "", 27, True),
+            TeamInGame.from_team_info("San José State Spartans", "San José St", "SJSU", "", 24, False),
+        ],
+        date="20241130",
+        is_over=True,
+        is_neutral_site=False,
+        event_id="401628450",
+        start_time="2024-11-30T22:00Z",
+    )
+    pending_game = Game(
+        teams=[
+            TeamInGame.from_team_info("Ohio State Buckeyes", "Ohio State", "OSU", "", 0, True),
+            TeamInGame.from_team_info("Michigan Wolverines", "Michigan", "MICH", "", 0, False),
+        ],
+        date="20241130",
+        is_over=False,
+        is_neutral_site=False,
+    )
+    bets = [
+        MoneylineBet(
+            bettor="Lee", game=game, odds=-135, result=None, resulting_unit_profit=0.0, taking_team=game.teams[0].team
+        ),
+        SpreadBet(
+            bettor="Lee",
+            game=game,
+            odds=-110,
+            result=None,
+            resulting_unit_profit=0.0,
+            taking_team=game.teams[1].team,
+            taking_spread=2.5,
+        ),
+        OverBet(bettor="Lee", game=pending_game, odds=105, result=None, resulting_unit_profit=0.0, taking_points=44.5),
+    ]
+    # Built without new_bet/new_sub_betgroup so there are no parent links for asdict to chase
+    bettor = BetGroup(group_name="Lee", bets=bets, hits=1, misses=0, pushes=1, pendings=1, profit=0.1 + 0.2)
+    show = BetGroup(group_name="Pick Six – “Best Bets”", sub_betgroups={"Lee": bettor}, profit=float("inf"))
+    return BetGroup(group_name="week 14", sub_betgroups={show.group_name: show}, profit=-1e-7)
+
+
+@pytest.mark.parametrize("indent", [4, None, 0])
+def test_dump_matches_json_dumps_of_asdict(indent):
+    week = make_week()
+    # indent=None streams compact, without json.dumps' default spaces
+    separators = (",", ":") if indent is None else None
+    expected = json.dumps(asdict(week, dict_factory=to_output_dict), indent=indent, separators=separators)
+    streamed = io.StringIO()
+    jsonstream.dump(week, streamed, indent=indent)
+    assert streamed.getvalue().encode() == expected.encode()
@@ -0,0 +1,68 @@
+import numpy as np
+import pytest
+from bet import MoneylineBet, OverBet, SpreadBet, TeamOverBet, TeamUnderBet, UnderBet
+from game import Game
+from settlement import bets_to_columns, settle, settle_bets
+from team import TeamInGame
+
+
+def make_game(home_score: int, away_score: int, is_over: bool = True) -> Game:
+    return Game(
+        teams=[
+            TeamInGame.from_team_info("Ohio State Buckeyes", "Ohio State", "OSU", "", home_score, True),
+            TeamInGame.from_team_info("Michigan Wolverines", "Michigan", "MICH", "", away_score, False),
+        ],
+        date="20241130",
+        is_over=is_over,
+        is_neutral_site=False,
+    )
+
+
+def make_bets(game: Game, odds: int):
+    home = game.teams[0].team
+    away = game.teams[1].team
+    return [
+        MoneylineBet(bettor="a", game=game, odds=odds, result=None, resulting_unit_profit=0.0, taking_team=home),
+        MoneylineBet(bettor="a", game=game, odds=odds, result=None, resulting_unit_profit=0.0, taking_team=away),
+        SpreadBet(
+            bettor="a", game=game, odds=odds, result=None, resulting_unit_profit=0.0, taking_team=home, taking_spread=-3.0
+        ),
+        SpreadBet(
+            bettor="a", game=game, odds=odds, result=None, resulting_unit_profit=0.0, taking_team=away, taking_spread=3.5
+        ),
+        OverBet(bettor="a", game=game, odds=odds, result=None, resulting_unit_profit=0.0, taking_points=41.0),
+        UnderBet(bettor="a", game=game, odds=odds, result=None, resulting_unit_profit=0.0, taking_points=41.0),
+        OverBet(bettor="a", game=game, odds=odds, result=None, resulting_unit_profit=0.0, taking_points=40.5),
+        TeamOverBet(
+            bettor="a", game=game, odds=odds, result=None, resulting_unit_profit=0.0, taking_team=home, taking_points=21.0
+        ),
+        TeamUnderBet(
+            bettor="a", game=game, odds=odds, result=None, resulting_unit_profit=0.0, taking_team=away, taking_points=20.0
+        ),
+    ]
+
+
+@pytest.mark.parametrize(
+    "home_score, away_score, is_over",
+    [
+        (24, 17, True),  # spread -3 hits, total 41 pushes
+        (20, 17, True),  # spread -3 pushes
+        (20, 20, True),  # moneyline tie, both sides miss
+        (21, 20, True),  # team total 21 and 20 push
+        (10, 31, True),
+        (24, 17, False),  # still pending
+    ],
+)
+@pytest.mark.parametrize("odds", [-110, 150, -100, 100, -250])
+def test_settle_matches_evaluate(home_score, away_score, is_over, odds):
+    bets = make_bets(make_game(home_score, away_score, is_over), odds)
+    results, unit_profit = settle_bets(bets)
+    assert results == [bet.result for bet in bets]
+    np.testing.assert_allclose(unit_profit, [bet.resulting_unit_profit for bet in bets])
+
+
+def test_settle_rejects_zero_odds():
+    # Pending, so constructing the bets doesn't trip over the odds first
+    columns = bets_to_columns(make_bets(make_game(0, 0, is_over=False), 0))
+    with pytest.raises(ValueError):
+        settle(columns)
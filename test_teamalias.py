@@ -0,0 +1,46 @@
+import pytest
+from teamalias import AmbiguousTeamNameError, TeamAliasIndex
+
+SLATE = [
+    ("Michigan State Spartans", "Michigan State", "MSU"),
+    ("Ohio State Buckeyes", "Ohio State", "OSU"),
+    ("Oklahoma State Cowboys", "Oklahoma State", "OKST"),
+    ("Mississippi State Bulldogs", "Mississippi St", "MSST"),
+    ("Alabama Crimson Tide", "Alabama", "ALA"),
+]
+
+
+@pytest.fixture
+def team_alias_index() -> TeamAliasIndex:
+    return TeamAliasIndex(SLATE)
+
+
+def test_off_slate_team_does_not_resolve_to_a_similar_name(team_alias_index):
+    # Michigan isn't playing, Michigan State is
+    assert team_alias_index.resolve("Michigan") is None
+    assert team_alias_index.resolve("Michigan Wolverines") is None
+
+
+@pytest.mark.parametrize(
+    "team_name, full_name",
+    [
+        ("Michigan St.", "Michigan State Spartans"),
+        ("michigan state", "Michigan State Spartans"),
+        ("Spartans", "Michigan State Spartans"),
+        ("Miss State", "Mississippi State Bulldogs"),
+        ("bama", "Alabama Crimson Tide"),
+        ("OSU", "Ohio State Buckeyes"),
+        ("Michigan Staet", "Michigan State Spartans"),
+        ("Alabamma", "Alabama Crimson Tide"),
+    ],
+)
+def test_resolve(team_alias_index, team_name, full_name):
+    assert team_alias_index.resolve(team_name) == full_name
+
+
+def test_close_fallback_matches_are_ambiguous():
+    team_alias_index = TeamAliasIndex(
+        [("Georgia Tech Yellow Jackets", "Georgia Tech", "GT"), ("Georgia State Panthers", "Georgia State", "GAST")]
+    )
+    with pytest.raises(AmbiguousTeamNameError):
+        team_alias_index.resolve("Georgia Stec")
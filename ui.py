@@ -1,9 +1,29 @@
+import argparse
 import dash
-from dash import html, Input, Output
+from dash import dcc, html, ctx, Input, Output, State, ALL, MATCH
 import dash_bootstrap_components as dbc
+import flask
+import json
 import os
 import pickle
+import sys
+import traceback
+from typing import Mapping
 from betgroup import BetGroup
+from betstore import BETS_DB_FILENAME, BetStore
+from refresher import RENDER_VERSIONS_HISTORY, BackgroundRefresher, Snapshot
+from snapshotfile import SnapshotReader, SnapshotWriter, watch_refresh_requests
+from leaderboard import LEADERBOARD_DIMENSIONS, Leaderboards, load_week_rollups, save_week_rollups
+from lazyweeks import (
+    BetGroupSummary,
+    LazyBetGroups,
+    get_betgroup_header,
+    load_lazy_betgroups_from_disk,
+    load_lazy_betgroups_from_store,
+    save_betgroup_summaries,
+)
+from metrics import metrics
+from fragmentcache import FragmentCache
 from team import TeamInGame
 from bet import (
     BetTypes,
@@ -15,7 +35,12 @@ from bet import (
     TeamOverBet,
     TeamUnderBet,
 )
-from espnquery import query_cfb_games_data_for_dates, update_cfb_games_for_betgroup
+from espnquery import (
+    pad_date_window,
+    query_cfb_games_data_for_date_windows,
+    update_cfb_games_for_betgroup,
+    ScoreboardIndex,
+)
 
 
 def load_all_cfb_betgroups_from_disk(bets_folder):
@@ -29,30 +54,122 @@ def load_all_cfb_betgroups_from_disk(bets_folder):
     return betgroups
 
 
-def refresh_pending_cfb_betgroups(betgroups: dict[str, BetGroup]):
-    for betgroup_filepath, betgroup in betgroups.items():
-        start_date, end_date = betgroup.get_start_and_end_dates_of_all_bets()
-        if start_date == end_date:
-            end_date = None
-        games_data = query_cfb_games_data_for_dates(start_date, end_date)
-        update_cfb_games_for_betgroup(betgroup, games_data, only_pending=True)
-        betgroup.evaluate()
-        betgroup.save_to_disk(betgroup_filepath)
-        with open(os.path.join(os.path.dirname(betgroup_filepath), "output.json"), "w") as f:
-            f.write(betgroup.to_json())
+def load_all_cfb_betgroups(bets_folder: str, bet_store: BetStore = None) -> LazyBetGroups:
+    # Nothing gets unpickled here, weeks load the first time they're opened or refreshed
+    if bet_store is not None:
+        return load_lazy_betgroups_from_store(bet_store)
+    return load_lazy_betgroups_from_disk(bets_folder)
+
+
+def refresh_pending_cfb_betgroup(
+    betgroup_filepath: str, betgroup: BetGroup, games_data: dict, bet_store: BetStore = None
+):
+    changed_games = []
+    changed_bets = []
+    if games_data is not None:
+        # Bet result changes get propagated up the tree as the games are updated
+        with metrics.timed("refresh_update_games"):
+            update_cfb_games_for_betgroup(
+                betgroup,
+                ScoreboardIndex(games_data),
+                only_pending=True,
+                changed_games=changed_games,
+                changed_bets=changed_bets,
+            )
+    fingerprint = betgroup.get_unsaved_fingerprint()
+    if fingerprint is None:
+        # Nothing changed since this week was last saved
+        metrics.increment("refresh_saves_skipped")
+        return
+    with metrics.timed("refresh_save"):
+        if bet_store is not None:
+            # Only the changed game, bet and aggregate rows get written
+            bet_store.save_changes(changed_games, changed_bets)
+        else:
+            betgroup.save_to_disk(betgroup_filepath, fingerprint=fingerprint, mark_saved=False)
+    with metrics.timed("refresh_write_json"):
+        betgroup.save_json_to_disk(os.path.join(os.path.dirname(betgroup_filepath), "output.json"))
+    # If either write failed the week stays unsaved and the next refresh tries again
+    betgroup.mark_saved(fingerprint)
+
+
+def refresh_pending_cfb_betgroups(
+    betgroups: Mapping[str, BetGroup], bet_store: BetStore = None, bets_folder: str = None
+):
+    with metrics.timed("refresh"):
+        # Settled weeks can't change anymore, so they aren't loaded, fetched, evaluated or saved
+        pending_betgroups = {
+            betgroup_filepath: betgroups[betgroup_filepath]
+            for betgroup_filepath in betgroups
+            if not get_betgroup_header(betgroups, betgroup_filepath).is_settled
+        }
+        # A game's date is its kickoff's UTC date but ESPN files games under their US date,
+        # so a late Saturday kickoff is on Saturday's scoreboard with a Sunday date
+        date_windows = [
+            pad_date_window(*betgroup.get_start_and_end_dates_of_all_bets(only_pending=True))
+            for betgroup in pending_betgroups.values()
+        ]
+        # Every week's days get fetched up front, concurrently
+        with metrics.timed("refresh_fetch"):
+            all_games_data = query_cfb_games_data_for_date_windows(date_windows)
+
+        for (betgroup_filepath, betgroup), games_data in zip(pending_betgroups.items(), all_games_data):
+            # One week that can't be updated or saved shouldn't hold up the others
+            try:
+                refresh_pending_cfb_betgroup(betgroup_filepath, betgroup, games_data, bet_store=bet_store)
+            except Exception:
+                print(f"Couldn't refresh {betgroup_filepath}:", file=sys.stderr)
+                traceback.print_exc()
+                metrics.increment("refresh_week_failures")
+
+        # Lets the next start draw every header without loading any week
+        if bet_store is None and bets_folder is not None and isinstance(betgroups, LazyBetGroups):
+            save_betgroup_summaries(
+                bets_folder, betgroups.get_summaries(source_filepaths={key: key for key in betgroups})
+            )
+
+
+
+def get_bet_card_values(bet: Bet) -> dict:
+    # Everything on a card that can change after it's drawn, pushed by push_live_updates
+    if bet.resulting_unit_profit >= 0:
+        profit_str = f"Profit: {bet.resulting_unit_profit:+.2f} units"
+    else:
+        profit_str = f"Loss: {bet.resulting_unit_profit:+.2f} units"
+    return {
+        "left_score": f"{bet.game.teams[0].score}",
+        "right_score": f"{bet.game.teams[1].score}",
+        "status": f"{bet.result.upper()}",
+        "profit": profit_str,
+        "color": {
+            "hit": "success",
+            "miss": "danger",
+            "push": "warning",
+            "pending": "secondary",
+        }[bet.result],
+    }
+
+
+def get_bet_key(section_path: list[str], bet_idx: int) -> str:
+    return json.dumps(section_path + [bet_idx])
 
 
-def bet_to_card(bet: Bet):
+def bet_to_card(bet: Bet, bet_key: str):
     game = bet.game
     teams = game.teams
+    card_values = get_bet_card_values(bet)
 
     left_logo_img = html.Img(src=teams[0].logo_url, width="80px", height="80px")
     left_team_span = html.Span(f"{teams[0].full_name}", className="small")
-    left_score_span = html.Big(f"{teams[0].score}", className="left-score")
+    left_score_span = html.Big(
+        card_values["left_score"], id={"type": "bet-left-score", "bet": bet_key}, className="left-score"
+    )
     dash_big = html.Big(" - ")
     right_logo_img = html.Img(src=teams[1].logo_url, width="80px", height="80px")
     right_team_span = html.Span(f"{teams[1].full_name}", className="small")
-    right_score_span = html.Big(f"{teams[1].score}", className="right-score")
+    right_score_span = html.Big(
+        card_values["right_score"], id={"type": "bet-right-score", "bet": bet_key}, className="right-score"
+    )
 
     bettor_small = html.Small(f"Picked by {bet.bettor}")
     if isinstance(bet, MoneylineBet):
@@ -98,22 +215,11 @@ def bet_to_card(bet: Bet):
         ],
         className="d-flex justify-content-center align-items-center gap-4 mb-3",
     )
-    status_div = html.Div(f"{bet.result.upper()}", className="status")
-    if bet.resulting_unit_profit >= 0:
-        profit_str = f"Profit: {bet.resulting_unit_profit:+.2f} units"
-    else:
-        profit_str = f"Loss: {bet.resulting_unit_profit:+.2f} units"
+    status_div = html.Div(card_values["status"], id={"type": "bet-status", "bet": bet_key}, className="status")
     profit_div = html.Div(
-        profit_str, className="profit"
+        card_values["profit"], id={"type": "bet-profit", "bet": bet_key}, className="profit"
     )
 
-    result_color = {
-        "hit": "success",
-        "miss": "danger",
-        "push": "warning",
-        "pending": "secondary",
-    }[bet.result]
-
     return dbc.Card(
         dbc.CardBody(
             [
@@ -125,66 +231,493 @@ def bet_to_card(bet: Bet):
             ],
             className="text-center",
         ),
-        color=result_color,
+        id={"type": "bet-card", "bet": bet_key},
+        color=card_values["color"],
         inverse=True,
         className="mb-4",
     )
 
 
-# Recursive function to display BetGroup and its children
-def betgroup_to_layout(betgroup: BetGroup, level=1):
-    children = []
+# Cards and headers are only rebuilt when the bet, game or betgroup behind them changed
+fragment_cache = FragmentCache()
+
+
+def get_cached_bet_card(bet: Bet, bet_key: str):
+    return fragment_cache.get_or_render(
+        ("card", bet_key, bet.get_render_version()), lambda: bet_to_card(bet, bet_key)
+    )
+
+
+def get_cached_betgroup_header(betgroup: BetGroup | BetGroupSummary, section_path: list[str], level=1):
+    # Summaries don't have versions, but there's only one per week and they're cheap to draw
+    if not isinstance(betgroup, BetGroup):
+        return betgroup_to_layout(betgroup, section_path, level=level)
+    return fragment_cache.get_or_render(
+        ("header", betgroup._version, get_section_key(section_path), level),
+        lambda: betgroup_to_layout(betgroup, section_path, level=level),
+    )
+
+
+def get_section_key(section_path: list[str]) -> str:
+    return json.dumps(section_path)
+
+
+def get_betgroup_for_section(section_path: list[str]) -> BetGroup:
+    betgroup = snapshot_source.snapshot.betgroups[section_path[0]]
+    for group_name in section_path[1:]:
+        betgroup = betgroup.sub_betgroups[group_name]
+    return betgroup
+
+
+def get_betgroup_header_text(betgroup: BetGroup | BetGroupSummary) -> str:
+    if betgroup.profit >= 0:
+        return f"{betgroup.group_name} (Profit: {betgroup.profit:.2f}units -- {betgroup.hits} hits, {betgroup.misses} misses)"
+    return f"{betgroup.group_name} (Loss: {betgroup.profit:.2f}units -- {betgroup.hits} hits, {betgroup.misses} misses)"
+
+
+# Only the header of a BetGroup gets built here, its contents get built by
+# toggle_betgroup_section when the section is expanded
+def betgroup_to_layout(betgroup: BetGroup, section_path: list[str], level=1):
     header = (
         html.H2
         if level == 1
         else html.H3 if level == 2 else html.H4 if level == 3 else html.H5 if level == 4 else html.H6
     )
-    if betgroup.profit >= 0:
-        profit_str = f"{betgroup.group_name} (Profit: {betgroup.profit:.2f}units -- {betgroup.hits} hits, {betgroup.misses} misses)"
-    else:
-        profit_str = f"{betgroup.group_name} (Loss: {betgroup.profit:.2f}units -- {betgroup.hits} hits, {betgroup.misses} misses)"
-    children.append(
-        header(
-            profit_str,
-            style={"marginTop": "24px"},
-        )
+    section_key = get_section_key(section_path)
+    return html.Div(
+        [
+            html.Div(
+                header(
+                    get_betgroup_header_text(betgroup),
+                    id={"type": "betgroup-header-text", "section": section_key},
+                ),
+                id={"type": "betgroup-header", "section": section_key},
+                n_clicks=0,
+                className="betgroup-header",
+                style={"marginTop": "24px"},
+            ),
+            dbc.Collapse(
+                id={"type": "betgroup-section", "section": section_key},
+                is_open=False,
+            ),
+        ]
     )
-    if betgroup.bets:
-        cards = [bet_to_card(bet) for bet in betgroup.bets]
-        children.append(dbc.Row([dbc.Col(card, xs=12, sm=12, md=12, lg=6) for card in cards]))
-    else:
-        for sub in betgroup.sub_betgroups.values():
-            children.append(betgroup_to_layout(sub, level=level + 1))
-    return html.Div(children)
 
 
-def gimme_the_goods(betgroups: list[BetGroup]):
-    refresh_pending_cfb_betgroups(betgroups)
+def betgroup_section_to_layout(betgroup: BetGroup, section_path: list[str], level=1):
+    if betgroup.bets:
+        cards = [
+            get_cached_bet_card(bet, get_bet_key(section_path, bet_idx))
+            for bet_idx, bet in enumerate(betgroup.bets)
+        ]
+        return [dbc.Row([dbc.Col(card, xs=12, sm=12, md=12, lg=6) for card in cards])]
     return [
-        html.H1("College Football Bets Tracker v0.1", style={"marginTop": "24px"}),
-        html.P("(Early preview version) automatically tracks CFB bets from the best sports shows. More shows will be added. Data updates every time you hit the Refresh button.",),
-        html.Div([betgroup_to_layout(bg) for bg in betgroups.values()]),
+        get_cached_betgroup_header(sub, section_path + [sub_name], level=level + 1)
+        for sub_name, sub in betgroup.sub_betgroups.items()
     ]
 
 
-all_betgroups = load_all_cfb_betgroups_from_disk("/home/caleb/cfb-bets-tracker/bets")
+def gimme_the_goods(betgroups: Mapping[str, BetGroup]):
+    with metrics.timed("layout"):
+        return [
+            html.H1("College Football Bets Tracker v0.1", style={"marginTop": "24px"}),
+            html.P("(Early preview version) automatically tracks CFB bets from the best sports shows. More shows will be added. Scores update on the page by themselves while games are live, hit the Refresh button to check right now. Click a week, show or bettor to expand it.",),
+            html.Div(
+                [
+                    get_cached_betgroup_header(get_betgroup_header(betgroups, betgroup_filepath), [betgroup_filepath])
+                    for betgroup_filepath in betgroups
+                ]
+            ),
+        ]
+
+
+LEADERBOARD_SIZE = 25
+LEADERBOARD_PREFIX_HIDDEN_STYLE = {"display": "none"}
+
+
+def get_leaderboard_prefix_options(dimension: str, prefix_value: str) -> tuple[list[dict], str]:
+    # Two-level leaderboards get ranked within one prefix at a time, e.g. bettors on spreads
+    current_leaderboards = get_leaderboards()
+    if len(LEADERBOARD_DIMENSIONS[dimension]) == 1:
+        prefixes = [()]
+    elif current_leaderboards is None:
+        prefixes = []
+    else:
+        prefixes = current_leaderboards.get_prefixes(dimension)
+    options = [{"label": " / ".join(prefix), "value": json.dumps(prefix)} for prefix in prefixes]
+    if prefix_value not in {option["value"] for option in options}:
+        prefix_value = options[0]["value"] if len(options) > 0 else None
+    return options, prefix_value
+
+
+def leaderboard_to_layout(dimension: str, prefix_value: str):
+    current_leaderboards = get_leaderboards()
+    if current_leaderboards is None:
+        return html.P("Leaderboards are still loading, hit Refresh in a bit.")
+    if prefix_value is None:
+        return html.P("No bets yet.")
+    rows = current_leaderboards.get_leaderboard(dimension, tuple(json.loads(prefix_value)), limit=LEADERBOARD_SIZE)
+    if len(rows) == 0:
+        return html.P("No bets yet.")
+    return dbc.Table(
+        [
+            html.Thead(
+                html.Tr(
+                    [
+                        html.Th("#"),
+                        html.Th(LEADERBOARD_DIMENSIONS[dimension][-1]),
+                        html.Th("Record"),
+                        html.Th("Pending"),
+                        html.Th("Profit"),
+                    ]
+                )
+            ),
+            html.Tbody(
+                [
+                    html.Tr(
+                        [
+                            html.Td(rank),
+                            html.Td(value),
+                            html.Td(f"{standing.hits}-{standing.misses}-{standing.pushes}"),
+                            html.Td(standing.pendings),
+                            html.Td(f"{standing.profit:.2f}u"),
+                        ]
+                    )
+                    for rank, (value, standing) in enumerate(rows, start=1)
+                ]
+            ),
+        ],
+        size="sm",
+        striped=True,
+    )
+
+
+BETS_FOLDER = os.environ.get("CFB_BETS_ROOT", "/home/caleb/cfb-bets-tracker/bets")
+HOST = os.environ.get("CFB_HOST", "0.0.0.0")
+# How often open pages ask for changed scores, 0 turns it off
+LIVE_UPDATE_SECONDS = float(os.environ.get("CFB_LIVE_UPDATE_SECONDS", "30"))
+PORT = int(os.environ.get("CFB_PORT", "42069"))
+# How long a Refresh click waits for the refresh it started or joined
+REFRESH_WAIT_SECONDS = 10
+# Set to serve from several processes: one runs `ui.py --refresh-only` and writes snapshots here,
+# the rest (e.g. `gunicorn -w 8 'ui:create_app()'`) only read them
+SNAPSHOTS_FOLDER = os.environ.get("CFB_SNAPSHOTS_ROOT")
+
+
+# Kept up to date by the refresher's evaluations through the bet result listener
+leaderboards = Leaderboards()
+leaderboards.listen()
+# What the saved week rollups were written from, so they're only written when something moved
+leaderboards_saved_version = None
+
+# Set by configure(), so importing this (benchmark.py, tests) doesn't load or start anything
+BETS_DB_FILEPATH = None
+bet_store: BetStore = None
+all_betgroups: LazyBetGroups = None
+background_refresher: BackgroundRefresher = None
+snapshot_reader: SnapshotReader = None
+snapshot_source: BackgroundRefresher | SnapshotReader = None
+
+
+def fill_in_leaderboards(betgroups: Mapping[str, BetGroup]):
+    # The store's bets, or the rollups saved by the last run, cover most weeks without loading them
+    if leaderboards.get_num_weeks() == 0:
+        if bet_store is not None:
+            leaderboards.add_bet_rows(bet_store.query_leaderboard_bets(), keys=betgroups)
+        else:
+            for betgroup_filepath, week_rollups in load_week_rollups(
+                BETS_FOLDER, {betgroup_filepath: betgroup_filepath for betgroup_filepath in betgroups}
+            ).items():
+                leaderboards.add_week_rollups(betgroup_filepath, week_rollups)
+    for betgroup_filepath in betgroups:
+        if not get_betgroup_header(betgroups, betgroup_filepath).is_settled:
+            # Pending weeks get loaded to be refreshed anyway, their results are counted as they change
+            leaderboards.add_betgroup(betgroup_filepath, betgroups[betgroup_filepath])
+            continue
+        if not leaderboards.has_week(betgroup_filepath):
+            leaderboards.add_betgroup(betgroup_filepath, betgroups[betgroup_filepath], track=False)
+        # A settled week is counted for good and its last state was already published,
+        # so it doesn't need to stay loaded or be copied into every snapshot
+        if isinstance(betgroups, LazyBetGroups) and betgroups.is_loaded(betgroup_filepath):
+            leaderboards.untrack(betgroup_filepath)
+            betgroups.unload(betgroup_filepath, source_filepath=betgroup_filepath)
+
+
+def refresh_in_background(betgroups: Mapping[str, BetGroup]):
+    global leaderboards_saved_version
+    fill_in_leaderboards(betgroups)
+    refresh_pending_cfb_betgroups(betgroups, bet_store=bet_store, bets_folder=BETS_FOLDER)
+    # The store is where the rollups come from next time, the .bets files need them saved
+    if bet_store is None and leaderboards.version != leaderboards_saved_version:
+        leaderboards_saved_version = leaderboards.version
+        save_week_rollups(
+            BETS_FOLDER,
+            leaderboards.get_week_rollups(),
+            {betgroup_filepath: betgroup_filepath for betgroup_filepath in betgroups},
+        )
+
+
+def get_leaderboards() -> Leaderboards:
+    # None until every week is in them
+    if background_refresher is None:
+        return snapshot_reader.get_leaderboards()
+    if leaderboards.get_num_weeks() < len(background_refresher.betgroups):
+        return None
+    return leaderboards
+
+
+def configure(bets_folder: str, snapshots_folder: str = SNAPSHOTS_FOLDER, is_refresher: bool = False):
+    global BETS_FOLDER, BETS_DB_FILEPATH, bet_store, all_betgroups
+    global background_refresher, snapshot_reader, snapshot_source, leaderboards_saved_version
+    BETS_FOLDER = bets_folder
+    # Import the .bets pickles with BetStore.import_from_pickles to switch to the SQLite store
+    BETS_DB_FILEPATH = os.path.join(BETS_FOLDER, BETS_DB_FILENAME)
+
+    bet_store = BetStore(BETS_DB_FILEPATH) if os.path.exists(BETS_DB_FILEPATH) else None
+    all_betgroups = load_all_cfb_betgroups(BETS_FOLDER, bet_store=bet_store)
+    if snapshots_folder is not None and not is_refresher:
+        # Another process refreshes, this one only maps what it publishes
+        background_refresher = None
+        snapshot_reader = SnapshotReader(snapshots_folder, fallback_betgroups=all_betgroups)
+        snapshot_source = snapshot_reader
+        return
+    # Filled in again for these weeks by the first refresh
+    leaderboards.clear()
+    leaderboards_saved_version = None
+    # ESPN polling, saving and evaluation all happen on the refresher's thread, first refresh
+    # included, so startup never waits on ESPN. Page loads and callbacks only read its latest snapshot.
+    background_refresher = BackgroundRefresher(all_betgroups, refresh=refresh_in_background)
+    snapshot_reader = None
+    snapshot_source = background_refresher
+    if snapshots_folder is not None:
+        snapshot_writer = SnapshotWriter(snapshots_folder, leaderboards=leaderboards)
+        background_refresher.publish_listeners.append(snapshot_writer.write)
+        snapshot_writer.write(background_refresher.snapshot)
+    background_refresher.start()
+
+
+def parse_args() -> argparse.Namespace:
+    parser = argparse.ArgumentParser(description="Serve the bets tracker.")
+    parser.add_argument("--bets-root", default=BETS_FOLDER, help="defaults to $CFB_BETS_ROOT")
+    parser.add_argument("--host", default=HOST, help="defaults to $CFB_HOST")
+    parser.add_argument("--port", type=int, default=PORT, help="defaults to $CFB_PORT")
+    parser.add_argument("--snapshots-root", default=SNAPSHOTS_FOLDER, help="defaults to $CFB_SNAPSHOTS_ROOT")
+    parser.add_argument(
+        "--refresh-only",
+        action="store_true",
+        help="only refresh and write snapshots to --snapshots-root, for other processes to serve",
+    )
+    args = parser.parse_args()
+    if args.refresh_only and args.snapshots_root is None:
+        parser.error("--refresh-only needs --snapshots-root")
+    return args
+
+
+def serve_layout():
+    snapshot = snapshot_source.snapshot
+    prefix_options, prefix_value = get_leaderboard_prefix_options("bettor", None)
+    return dbc.Container(
+        [
+            html.Button("Refresh", id="refresh-button", className="btn btn-primary mb-3"),
+            dcc.Interval(
+                id="live-update-interval",
+                interval=max(LIVE_UPDATE_SECONDS, 1) * 1000,
+                disabled=LIVE_UPDATE_SECONDS <= 0,
+            ),
+            # The snapshot this page is showing, so updates only carry what changed since
+            dcc.Store(id="rendered-snapshot-version", data=snapshot.version),
+            # The weeks drawn in content-div, a snapshot with different ones redraws it
+            dcc.Store(id="rendered-week-keys", data=list(snapshot.betgroups)),
+            html.H2("Leaderboards", style={"marginTop": "24px"}),
+            dbc.Select(
+                id="leaderboard-dimension",
+                options=[
+                    {"label": dimension.replace("_", " "), "value": dimension}
+                    for dimension in LEADERBOARD_DIMENSIONS
+                ],
+                value="bettor",
+                className="mb-3",
+            ),
+            dbc.Select(
+                id="leaderboard-prefix",
+                options=prefix_options,
+                value=prefix_value,
+                className="mb-3",
+                style=LEADERBOARD_PREFIX_HIDDEN_STYLE,
+            ),
+            html.Div(id="leaderboard-div", children=leaderboard_to_layout("bettor", prefix_value)),
+            html.Div(
+                id="content-div",
+                children=gimme_the_goods(snapshot.betgroups),
+            ),
+        ],
+        fluid=True,
+        className="dbc",
+    )
+
 
 # Compose layout
 app = dash.Dash(__name__, external_stylesheets=[dbc.themes.DARKLY, "/assets/styles.css"])
-app.layout = dbc.Container(
-    [
-        html.Button("Refresh", id="refresh-button", className="btn btn-primary mb-3"),
-        html.Div(id="content-div", children=gimme_the_goods(all_betgroups)),
-    ],
-    fluid=True,
-    className="dbc",
+# Dash draws the layout as soon as it's set, so it's set by create_app() once there's a snapshot
+server = app.server
+
+
+def get_bet_for_key(snapshot: Snapshot, bet_key: str) -> tuple[Bet, list[str]]:
+    bet_path = json.loads(bet_key)
+    betgroup = snapshot.betgroups[bet_path[0]]
+    for group_name in bet_path[1:-1]:
+        betgroup = betgroup.sub_betgroups[group_name]
+    return betgroup.bets[bet_path[-1]], bet_path[:-1]
+
+
+def get_live_updates(snapshot: Snapshot, changed_render_keys: set[tuple], outputs_list: list) -> list:
+    bet_outputs_list = outputs_list[:5]
+    header_outputs = outputs_list[5]
+    card_values_by_bet_key = {}
+    for bet_output in bet_outputs_list[0]:
+        bet_key = bet_output["id"]["bet"]
+        try:
+            bet, section_path = get_bet_for_key(snapshot, bet_key)
+        except (KeyError, IndexError):
+            continue
+        if (
+            changed_render_keys is None
+            or ("game", bet.game.get_key()) in changed_render_keys
+            or ("section", tuple(section_path)) in changed_render_keys
+        ):
+            card_values_by_bet_key[bet_key] = get_bet_card_values(bet)
+
+    updates = []
+    for value_name, bet_outputs in zip(["left_score", "right_score", "status", "profit", "color"], bet_outputs_list):
+        updates.append(
+            [
+                card_values_by_bet_key[bet_output["id"]["bet"]][value_name]
+                if bet_output["id"]["bet"] in card_values_by_bet_key
+                else dash.no_update
+                for bet_output in bet_outputs
+            ]
+        )
+
+    header_updates = []
+    for header_output in header_outputs:
+        section_path = json.loads(header_output["id"]["section"])
+        if changed_render_keys is not None and ("section", tuple(section_path)) not in changed_render_keys:
+            header_updates.append(dash.no_update)
+            continue
+        try:
+            betgroup = get_betgroup_header(snapshot.betgroups, section_path[0])
+            for group_name in section_path[1:]:
+                betgroup = betgroup.sub_betgroups[group_name]
+        except KeyError:
+            header_updates.append(dash.no_update)
+            continue
+        header_updates.append(get_betgroup_header_text(betgroup))
+    updates.append(header_updates)
+    return updates
+
+
+# Every open page polls with one of the last few versions, so the diffs get worked out once each
+changed_render_keys_cache = FragmentCache(maxsize=4 * RENDER_VERSIONS_HISTORY, metrics_name="changed_render_keys_cache")
+
+
+def get_changed_render_keys(since_version: int, snapshot: Snapshot) -> set[tuple]:
+    return changed_render_keys_cache.get_or_render(
+        (since_version, snapshot.version, snapshot.created_at),
+        lambda: snapshot_source.get_changed_render_keys(since_version, snapshot),
+    )
+
+
+# Only the score, status, profit and header text of what's on the page get sent, and only where the
+# game or betgroup behind it changed since the snapshot the page last saw. A page whose weeks
+# aren't the snapshot's weeks anymore gets its content redrawn instead.
+@app.callback(
+    Output({"type": "bet-left-score", "bet": ALL}, "children"),
+    Output({"type": "bet-right-score", "bet": ALL}, "children"),
+    Output({"type": "bet-status", "bet": ALL}, "children"),
+    Output({"type": "bet-profit", "bet": ALL}, "children"),
+    Output({"type": "bet-card", "bet": ALL}, "color"),
+    Output({"type": "betgroup-header-text", "section": ALL}, "children"),
+    Output("rendered-snapshot-version", "data"),
+    Output("rendered-week-keys", "data"),
+    Output("content-div", "children"),
+    Input("live-update-interval", "n_intervals"),
+    Input("refresh-button", "n_clicks"),
+    State("rendered-snapshot-version", "data"),
+    State("rendered-week-keys", "data"),
+    prevent_initial_call=True,
 )
+def push_live_updates(n_intervals, n_clicks, rendered_snapshot_version, rendered_week_keys):
+    if ctx.triggered_id == "refresh-button":
+        # Everyone clicking during a refresh gets that same refresh's result
+        snapshot_source.request_refresh(wait_seconds=REFRESH_WAIT_SECONDS)
+    snapshot = snapshot_source.snapshot
+    no_live_updates = [[dash.no_update] * len(outputs) for outputs in ctx.outputs_list[:6]]
+    if snapshot.version == rendered_snapshot_version:
+        return no_live_updates + [dash.no_update, dash.no_update, dash.no_update]
+    week_keys = list(snapshot.betgroups)
+    if week_keys != rendered_week_keys:
+        return no_live_updates + [snapshot.version, week_keys, gimme_the_goods(snapshot.betgroups)]
+    with metrics.timed("layout_live_update"):
+        changed_render_keys = get_changed_render_keys(rendered_snapshot_version, snapshot)
+        return get_live_updates(snapshot, changed_render_keys, ctx.outputs_list[:6]) + [
+            snapshot.version,
+            dash.no_update,
+            dash.no_update,
+        ]
 
 
-@app.callback(Output("content-div", "children"), Input("refresh-button", "n_clicks"))
-def update_content(n_clicks):
-    return gimme_the_goods(all_betgroups)
+@app.callback(
+    Output("leaderboard-div", "children"),
+    Output("leaderboard-prefix", "options"),
+    Output("leaderboard-prefix", "value"),
+    Output("leaderboard-prefix", "style"),
+    Input("leaderboard-dimension", "value"),
+    Input("leaderboard-prefix", "value"),
+    Input("refresh-button", "n_clicks"),
+    prevent_initial_call=True,
+)
+def update_leaderboard(dimension, prefix_value, n_clicks):
+    with metrics.timed("layout_leaderboard"):
+        # A prefix picked for the last dimension gets swapped for one that fits this one
+        prefix_options, prefix_value = get_leaderboard_prefix_options(dimension, prefix_value)
+        prefix_style = LEADERBOARD_PREFIX_HIDDEN_STYLE if len(LEADERBOARD_DIMENSIONS[dimension]) == 1 else {}
+        return leaderboard_to_layout(dimension, prefix_value), prefix_options, prefix_value, prefix_style
+
+
+@app.callback(
+    Output({"type": "betgroup-section", "section": MATCH}, "is_open"),
+    Output({"type": "betgroup-section", "section": MATCH}, "children"),
+    Input({"type": "betgroup-header", "section": MATCH}, "n_clicks"),
+    State({"type": "betgroup-section", "section": MATCH}, "is_open"),
+    prevent_initial_call=True,
+)
+def toggle_betgroup_section(n_clicks, is_open):
+    if is_open:
+        return False, dash.no_update
+    section_path = json.loads(ctx.triggered_id["section"])
+    betgroup = get_betgroup_for_section(section_path)
+    with metrics.timed("layout_section"):
+        return True, betgroup_section_to_layout(betgroup, section_path, level=len(section_path))
+
+
+@server.route("/metrics")
+def serve_metrics():
+    return flask.Response(metrics.render_prometheus(), mimetype="text/plain; version=0.0.4")
+
+
+def create_app(bets_folder: str = BETS_FOLDER, snapshots_folder: str = SNAPSHOTS_FOLDER) -> flask.Flask:
+    # For WSGI servers, e.g. `gunicorn 'ui:create_app()'`, configured from the environment
+    configure(bets_folder, snapshots_folder=snapshots_folder)
+    app.layout = serve_layout
+    return server
 
 
 if __name__ == "__main__":
-    app.run(host="0.0.0.0", port=42069)
+    args = parse_args()
+    if args.refresh_only:
+        configure(args.bets_root, snapshots_folder=args.snapshots_root, is_refresher=True)
+        watch_refresh_requests(args.snapshots_root, background_refresher.request_refresh)
+        background_refresher.thread.join()
+    else:
+        create_app(args.bets_root, snapshots_folder=args.snapshots_root)
+        app.run(host=args.host, port=args.port)
@@ -0,0 +1,9 @@
+import itertools
+
+# Versions are never saved, everything loaded or unpickled gets a fresh one,
+# so they only have to be unique within this process
+version_counter = itertools.count(1)
+
+
+def next_version() -> int:
+    return next(version_counter)